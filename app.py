@@ -1,79 +1,447 @@
 import os
 import io
+import base64
+import csv
+import binascii
 import html
+import json
+import hashlib
 import logging
-from cs50 import SQL
-from flask import Flask, flash, jsonify, redirect, render_template, request, session, make_response
-from flask_session import Session
-from werkzeug.security import check_password_hash, generate_password_hash
+import mimetypes
+import sqlite3
+import time
+from functools import partial
+import click
+from flask import (Flask, Response, abort, flash, g, jsonify, redirect, render_template, request, session, make_response,
+                   send_file, send_from_directory, stream_with_context)
 from email_validator import validate_email, EmailNotValidError
-from weasyprint import HTML, CSS
-from weasyprint.text.fonts import FontConfiguration
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import datetime
 
 from helpers import login_required, get_technical_specs, get_certificates
+from assets import AssetManifest
+from compression import choose_encoding, compress_response
+from database import Database
+from email_index import EmailIndex
+from password_hashing import HasherBusy, PasswordHasher
+from project_changes import TOKEN_QUERY, decode_change_token, encode_change_token, ensure_changes_schema
+from project_form import project_form
+from project_export import EXPORT_FORMATS, export_projects, stream_csv, stream_ndjson
+from project_import import FORMATS, detect_format, import_projects, read_records
+from rate_limit import RateLimiter
+from reference_data import ReferenceData
+from search import ensure_search_index, is_broad, match_query, rank_expression
+from session_store import SqliteSessionInterface
+from pdf_cache import PdfCache, directory_digest, file_digest
+from pdf_render import PdfTemplates, render_pdf, warm_renderer
+from pdf_workers import PdfWorkerPool
+from pdf_prerender import PdfPrerenderer
+import pdf_batch
+from pdf_executor import get_executor
 
 logger = logging.getLogger(__name__)
 
 # Configure application
 app = Flask(__name__)
 
+# Number of proxies in front of the app (e.g. nginx) whose X-Forwarded-For/-Proto are trusted,
+# so request.remote_addr is the client's address and per-client limits work behind them
+app.config["PROXY_HOPS"] = int(os.environ.get("PROXY_HOPS", 0))
+if app.config["PROXY_HOPS"] > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_HOPS"], x_proto=app.config["PROXY_HOPS"])
+
 # Custom filter
 
-# Configure session to use filesystem (instead of signed cookies)
+# Configure server-side sessions: in-memory LRU in front of a SQLite table
 app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
-Session(app)
-
-# Configure CS50 Library to use SQlite database
-db = SQL("sqlite:///project.db")
+app.config["SESSION_DB_PATH"] = os.environ.get("SESSION_DB_PATH", "sessions.db")
+app.config["SESSION_IDLE_TIMEOUT"] = int(os.environ.get("SESSION_IDLE_TIMEOUT", 7 * 24 * 60 * 60))
+app.config["SESSION_CACHE_SIZE"] = int(os.environ.get("SESSION_CACHE_SIZE", 10000))
+app.config["SESSION_SWEEP_INTERVAL"] = int(os.environ.get("SESSION_SWEEP_INTERVAL", 300))
+app.session_interface = SqliteSessionInterface(app.config["SESSION_DB_PATH"], app.config["SESSION_IDLE_TIMEOUT"],
+                                               app.config["SESSION_CACHE_SIZE"], app.config["SESSION_SWEEP_INTERVAL"])
+
+# Serve static files under content-hashed URLs that can be cached for a year
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+assets = AssetManifest(app.static_folder)
+assets.build()
+app.jinja_env.globals["asset_url"] = assets.url
+
+# Compress text responses larger than this many bytes
+app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", 500))
+
+# Configure the SQLite database: a pool of WAL connections shared by all threads
+app.config["DB_MAX_CONNECTIONS"] = int(os.environ.get("DB_MAX_CONNECTIONS", 8))
+app.config["DB_BUSY_TIMEOUT_MS"] = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+app.config["DB_CACHE_SIZE_KIB"] = int(os.environ.get("DB_CACHE_SIZE_KIB", 16384))
+app.config["DB_MMAP_SIZE"] = int(os.environ.get("DB_MMAP_SIZE", 256 * 1024 * 1024))
+db = Database("project.db", app.config["DB_MAX_CONNECTIONS"], app.config["DB_BUSY_TIMEOUT_MS"],
+              app.config["DB_CACHE_SIZE_KIB"], app.config["DB_MMAP_SIZE"])
+
+# Reference tables (modification types, norms, legalization process) kept in memory
+reference_data = ReferenceData("project.db")
+
+# Registered emails kept in memory for the sign-up availability check
+email_index = EmailIndex("project.db")
+
+# Email availability checks per second (and burst) allowed to each client
+app.config["EMAIL_CHECK_RATE"] = float(os.environ.get("EMAIL_CHECK_RATE", 1))
+app.config["EMAIL_CHECK_BURST"] = int(os.environ.get("EMAIL_CHECK_BURST", 10))
+email_check_limiter = RateLimiter(app.config["EMAIL_CHECK_RATE"], app.config["EMAIL_CHECK_BURST"])
+
+# Hash passwords in a bounded thread pool; PASSWORD_HASH_METHOD sets the werkzeug method and cost
+app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+app.config["PASSWORD_HASH_QUEUE"] = int(os.environ.get("PASSWORD_HASH_QUEUE", 4 * app.config["PASSWORD_HASH_WORKERS"]))
+app.config["PASSWORD_HASH_TIMEOUT"] = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+password_hasher = PasswordHasher(app.config["PASSWORD_HASH_METHOD"], app.config["PASSWORD_HASH_WORKERS"],
+                                 app.config["PASSWORD_HASH_QUEUE"], app.config["PASSWORD_HASH_TIMEOUT"])
+
+# Full-text index over the projects, kept in sync by triggers
+ensure_search_index("project.db")
+
+# Deleted projects are remembered so other tabs can drop them (/projects/changes)
+ensure_changes_schema("project.db")
+app.config["PROJECT_CHANGES_MAX"] = int(os.environ.get("PROJECT_CHANGES_MAX", 500))
+
+# Number of projects per page in the project list
+app.config["PROJECTS_PAGE_SIZE"] = int(os.environ.get("PROJECTS_PAGE_SIZE", 50))
+app.config["PROJECTS_MAX_PAGE_SIZE"] = int(os.environ.get("PROJECTS_MAX_PAGE_SIZE", 200))
+
+# A one-word search shorter than SEARCH_BROAD_PREFIX_CHARS only ranks its newest SEARCH_MAX_CANDIDATES matches
+app.config["SEARCH_MAX_CANDIDATES"] = int(os.environ.get("SEARCH_MAX_CANDIDATES", 500))
+app.config["SEARCH_BROAD_PREFIX_CHARS"] = int(os.environ.get("SEARCH_BROAD_PREFIX_CHARS", 3))
+
+# Bulk import: rows per transaction and most row errors returned by /projects/import
+app.config["IMPORT_CHUNK_SIZE"] = int(os.environ.get("IMPORT_CHUNK_SIZE", 500))
+app.config["IMPORT_MAX_ERRORS"] = int(os.environ.get("IMPORT_MAX_ERRORS", 1000))
+
+# Most fields accepted by one /validate-fields request
+app.config["VALIDATE_FIELDS_MAX"] = int(os.environ.get("VALIDATE_FIELDS_MAX", 64))
+
+# Configure rendered PDF cache
+app.config["PDF_CACHE_DIR"] = os.environ.get("PDF_CACHE_DIR", os.path.join(app.root_path, "pdf_cache"))
+app.config["PDF_CACHE_MAX_BYTES"] = int(os.environ.get("PDF_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+pdf_cache = PdfCache(app.config["PDF_CACHE_DIR"], app.config["PDF_CACHE_MAX_BYTES"])
+
+# Let the front proxy send cached PDFs: X-Sendfile (Apache, lighttpd) or X-Accel-Redirect (nginx)
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE", "0") == "1"
+app.config["PDF_X_ACCEL_PREFIX"] = os.environ.get("PDF_X_ACCEL_PREFIX", "")
+pdf_templates = PdfTemplates(app.jinja_env, os.path.join(app.root_path, app.template_folder, "pdf"))
+
+# Render the PDF section by section so unchanged sections reuse their layout
+app.config["PDF_SECTION_CACHE"] = os.environ.get("PDF_SECTION_CACHE", "1") == "1"
+PDF_SECTIONS = ["pdf/secciones/cliente.html", "pdf/secciones/declaracion.html", "pdf/secciones/ficha_tecnica.html"]
+
+# Render /generate-pdf misses in the shared PDF process pool (PDF_BATCH_PROCESSES), so downloads
+# run in parallel; PDF_RENDER_IN_REQUEST=1 renders in the request thread, one at a time per process
+app.config["PDF_RENDER_IN_REQUEST"] = os.environ.get("PDF_RENDER_IN_REQUEST", "0") == "1"
+
+# Load PDF fonts and styles at startup so the first render is as fast as the rest
+# (the pool's processes warm their own renderer when they start)
+app.config["PDF_WARM_RENDERER"] = os.environ.get("PDF_WARM_RENDERER", "1") == "1"
+if app.config["PDF_WARM_RENDERER"] and app.config["PDF_RENDER_IN_REQUEST"]:
+    try:
+        warm_renderer(os.path.join(app.static_folder, 'pdf', 'styles.css'))
+    except Exception as e:
+        logger.error(f"Error preparando el generador de PDF: {e}")
+
+# Configure optional background PDF job queue (PDF_WORKERS=0 renders while the request waits)
+app.config["PDF_WORKERS"] = int(os.environ.get("PDF_WORKERS", 0))
+app.config["PDF_WORKER_MAX_RENDERS"] = int(os.environ.get("PDF_WORKER_MAX_RENDERS", 50))
+app.config["PDF_WORKER_MAX_RSS_MB"] = int(os.environ.get("PDF_WORKER_MAX_RSS_MB", 512))
+app.config["PDF_JOB_TIMEOUT"] = int(os.environ.get("PDF_JOB_TIMEOUT", 60))
+app.config["PDF_PRERENDER"] = os.environ.get("PDF_PRERENDER", "0") == "1"
+app.config["PDF_PRERENDER_MAX_CONCURRENT"] = int(os.environ.get("PDF_PRERENDER_MAX_CONCURRENT", 1))
+app.config["PDF_PRERENDER_DELAY"] = float(os.environ.get("PDF_PRERENDER_DELAY", 2))
+app.config["PDF_BATCH_PROCESSES"] = int(os.environ.get("PDF_BATCH_PROCESSES", os.cpu_count() or 1))
+app.config["PDF_BATCH_MAX_PROJECTS"] = int(os.environ.get("PDF_BATCH_MAX_PROJECTS", 500))
+pdf_workers = None
+if app.config["PDF_WORKERS"] > 0:
+    pdf_workers = PdfWorkerPool(pdf_cache, os.path.join(app.static_folder, 'pdf', 'styles.css'),
+                                app.config["PDF_WORKERS"], app.config["PDF_WORKER_MAX_RENDERS"],
+                                app.config["PDF_WORKER_MAX_RSS_MB"], app.config["PDF_JOB_TIMEOUT"])
 
 @app.after_request
 def after_request(response):
     """Ensure responses aren't cached"""
+    # Las vistas que validan con ETag indican su propia política en g.cache_control
+    if g.get("cache_control"):
+        response.headers["Cache-Control"] = g.cache_control
+        return response
     response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
     response.headers["Expires"] = 0
     response.headers["Pragma"] = "no-cache"
     return response
 
 
+@app.after_request
+def compress(response):
+    """Compress text responses for clients that accept gzip or brotli"""
+    return compress_response(response, request.accept_encodings, app.config["COMPRESS_MIN_SIZE"])
+
+
+@app.route("/assets/<path:filename>")
+def asset(filename):
+    """Serve a fingerprinted static file with long-lived caching"""
+    resolved = assets.resolve(filename)
+    if resolved is None:
+        abort(404)
+    source, data, variants = resolved
+
+    g.cache_control = f"public, max-age={ASSET_MAX_AGE}, immutable"
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding in variants:
+        response = make_response(variants[encoding])
+        response.mimetype = mimetypes.guess_type(source)[0] or "application/octet-stream"
+        response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        return response
+    if data is not None:
+        response = make_response(data)
+        response.mimetype = "text/css"
+        return response
+    return send_from_directory(app.static_folder, source, max_age=ASSET_MAX_AGE)
+
+
 
 @app.route("/", methods=["GET", "POST"])
 @login_required
 def index():
     """Main page"""
-    query = """
-            SELECT id, order_number, rae, lift_address, created_at, updated_at
-            FROM projects_test
-            WHERE user_id = ?
-            ORDER BY COALESCE(updated_at, created_at) DESC, id DESC
-            """
-
-    query_2 = """
-              SELECT code, label FROM modification_types
-              """
-
-    query_3 = """
-              SELECT code, label FROM applicable_norms
-              """
-
-    query_4 = """
-              SELECT code, label FROM legalization_process
-              """
-
-    projects =  db.execute(query, session["user_id"])
-    modification_types = db.execute(query_2)
-    applicable_norms = db.execute(query_3)
-    legalization_process = db.execute(query_4)
+    # El token se toma antes que la lista: lo que cambie entre medias llegará en /projects/changes
+    changes_token = encode_change_token(db.execute(TOKEN_QUERY)[0]["token"])
+    projects, next_cursor = fetch_projects_page(session["user_id"], None, app.config["PROJECTS_PAGE_SIZE"])
+    reference = reference_data.get()
+    modification_types = reference.modification_types.rows
+    applicable_norms = reference.applicable_norms.rows
+    legalization_process = reference.legalization_process.rows
     technical_specs = get_technical_specs()
     certificates = get_certificates()
     print("certificates", certificates);
 
-    return render_template("layout9.html", projects=projects, modification_types=modification_types,
+    return render_template("layout9.html", projects=projects, next_cursor=next_cursor, changes_token=changes_token,
+                            modification_types=modification_types,
                             applicable_norms=applicable_norms, legalization_process=legalization_process,
                             technical_specs=technical_specs, certificates=certificates)
 
 
+@app.route("/projects")
+@login_required
+def list_projects():
+    """Return a page of the user's projects, most recently active first"""
+    cursor = request.args.get("cursor") or None
+    limit = request.args.get("limit", str(app.config["PROJECTS_PAGE_SIZE"]))
+    if not limit.isdigit() or int(limit) < 1:
+        return jsonify({"success": False, "message": "Solicitud inválida"}), 400
+    limit = min(int(limit), app.config["PROJECTS_MAX_PAGE_SIZE"])
+
+    if cursor is not None:
+        cursor = decode_projects_cursor(cursor)
+        if cursor is None:
+            return jsonify({"success": False, "message": "Solicitud inválida"}), 400
+
+    projects, next_cursor = fetch_projects_page(session["user_id"], cursor, limit)
+    return jsonify({"success": True, "projects": projects, "nextCursor": next_cursor})
+
+
+@app.route("/projects/changes")
+@login_required
+def project_changes():
+    """Return the user's projects created, updated or deleted since a change token
+
+    Answers {"projects": [...], "deleted": [ids], "token": ...}; the client
+    passes the new token on its next call. Rows changed within a few seconds
+    of the token may be sent twice, so the client applies them as upserts.
+    With "reset": true the token is too old, or too much changed, and the
+    list should be loaded again.
+    """
+    now = db.execute(TOKEN_QUERY)[0]
+    token = encode_change_token(now["token"])
+    since = request.args.get("since")
+    if not since:
+        return jsonify({"success": True, "token": token, "projects": [], "deleted": [], "reset": False})
+    since = decode_change_token(since)
+    if since is None:
+        return jsonify({"success": False, "message": "Solicitud inválida"}), 400
+    if since < now["horizon"]:
+        return jsonify({"success": True, "token": token, "projects": [], "deleted": [], "reset": True})
+
+    projects = db.execute(
+        """SELECT id, order_number, rae, lift_address, created_at, updated_at
+        FROM projects_test
+        WHERE user_id = ? AND COALESCE(updated_at, created_at) >= ?
+        ORDER BY COALESCE(updated_at, created_at) DESC
+        LIMIT ?""",
+        session["user_id"], since, app.config["PROJECT_CHANGES_MAX"] + 1
+    )
+    if len(projects) > app.config["PROJECT_CHANGES_MAX"]:
+        return jsonify({"success": True, "token": token, "projects": [], "deleted": [], "reset": True})
+
+    deleted = db.execute(
+        "SELECT project_id FROM projects_deleted WHERE user_id = ? AND deleted_at >= ?",
+        session["user_id"], since
+    )
+    return jsonify({"success": True, "token": token, "projects": projects,
+                    "deleted": [row["project_id"] for row in deleted], "reset": False})
+
+
+@app.route("/projects/search")
+@login_required
+def search_projects():
+    """Return a ranked page of the user's projects matching a text query
+
+    "truncated" is true when only the newest matches of a very broad query
+    were ranked; the rest can be found by typing more.
+    """
+    page = request.args.get("page", "1")
+    limit = request.args.get("limit", str(app.config["PROJECTS_PAGE_SIZE"]))
+    if not page.isdigit() or int(page) < 1 or not limit.isdigit() or int(limit) < 1:
+        return jsonify({"success": False, "message": "Solicitud inválida"}), 400
+    page = int(page)
+    limit = min(int(limit), app.config["PROJECTS_MAX_PAGE_SIZE"])
+
+    text = request.args.get("q", "")
+    query = match_query(text)
+    if query is None:
+        return jsonify({"success": True, "projects": [], "hasMore": False, "truncated": False})
+
+    # Un prefijo corto coincide con casi todo: bm25 sobre miles de filas tarda decenas de ms
+    # y la búsqueda se acota al seguir escribiendo, así que sólo se puntúan las más recientes.
+    # Cualquier otra búsqueda puntúa todas sus coincidencias (LIMIT -1 = sin límite)
+    candidates = -1
+    truncated = False
+    if is_broad(text, app.config["SEARCH_BROAD_PREFIX_CHARS"]):
+        candidates = app.config["SEARCH_MAX_CANDIDATES"]
+        truncated = db.execute(
+            """SELECT count(*) AS n FROM (
+                SELECT 1 FROM projects_search
+                JOIN projects_test ON projects_test.id = projects_search.rowid
+                WHERE projects_search MATCH ? AND projects_test.user_id = ?
+                ORDER BY projects_search.rowid DESC
+                LIMIT ?)""",
+            query, session["user_id"], candidates + 1
+        )[0]["n"] > candidates
+
+    projects = db.execute(
+        f"""SELECT p.id, p.order_number, p.rae, p.lift_address, p.created_at, p.updated_at
+        FROM (SELECT projects_search.rowid AS id, {rank_expression()} AS score
+              FROM projects_search
+              JOIN projects_test ON projects_test.id = projects_search.rowid
+              WHERE projects_search MATCH ? AND projects_test.user_id = ?
+              ORDER BY projects_search.rowid DESC
+              LIMIT ?) AS candidates
+        JOIN projects_test p ON p.id = candidates.id
+        ORDER BY candidates.score, p.id DESC
+        LIMIT ? OFFSET ?""",
+        query, session["user_id"], candidates, limit + 1, (page - 1) * limit
+    )
+    return jsonify({"success": True, "projects": projects[:limit], "hasMore": len(projects) > limit,
+                    "truncated": truncated})
+
+
+@app.route("/projects/import", methods=["POST"])
+@login_required
+def import_projects_file():
+    """Import projects from an uploaded CSV or NDJSON file"""
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return jsonify({"success": False, "message": "Campo requerido"}), 400
+    file_format = request.form.get("format") or detect_format(upload.filename)
+    if file_format not in FORMATS:
+        return jsonify({"success": False, "message": "Formato no admitido: use CSV o NDJSON"}), 400
+
+    errors = []
+
+    def on_error(row, row_errors):
+        if len(errors) < app.config["IMPORT_MAX_ERRORS"]:
+            errors.append({"row": row, "errors": row_errors})
+
+    try:
+        imported, failed = import_projects(db, reference_data.get(), session["user_id"],
+                                           read_records(upload.stream, file_format), on_error,
+                                           app.config["IMPORT_CHUNK_SIZE"])
+    except (UnicodeDecodeError, csv.Error):
+        return jsonify({"success": False, "message": "No se ha podido leer el fichero"}), 400
+    except Exception as e:
+        logger.error(f"Error importando proyectos: {e}")
+        return jsonify({"success": False, "message": "Ha ocurrido un error al procesar su solicitud"}), 500
+
+    return jsonify({"success": True, "imported": imported, "failed": failed, "errors": errors,
+                    "errorsTruncated": failed > len(errors)})
+
+
+@app.route("/projects/export")
+@login_required
+def export_projects_file():
+    """Stream all the user's projects as CSV or NDJSON"""
+    file_format = request.args.get("format", "csv")
+    if file_format not in EXPORT_FORMATS:
+        return jsonify({"success": False, "message": "Formato no admitido: use CSV o NDJSON"}), 400
+    mimetype, extension = EXPORT_FORMATS[file_format]
+
+    projects = export_projects(db, reference_data.get(), session["user_id"])
+    stream = stream_csv(projects) if file_format == "csv" else stream_ndjson(projects)
+    response = Response(stream, content_type=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="proyectos.{extension}"'
+    return response
+
+
+def fetch_projects_page(user_id, cursor, limit):
+    """Return (projects, next_cursor) for one page of a user's project list
+
+    Pages are keyed on (last activity, id) instead of an offset, so every
+    page is a range scan of idx_projects_test_user_last_activity starting
+    right after the last row of the previous one.
+    """
+    query = """
+            SELECT id, order_number, rae, lift_address, created_at, updated_at,
+                   COALESCE(updated_at, created_at) AS last_activity
+            FROM projects_test
+            WHERE user_id = ?
+            """
+    args = [user_id]
+    if cursor is not None:
+        # La primera condición acota el rango del índice, la segunda desempata por id
+        query += """
+                 AND COALESCE(updated_at, created_at) <= ?
+                 AND (COALESCE(updated_at, created_at) < ? OR id < ?)
+                 """
+        args += [cursor[0], cursor[0], cursor[1]]
+    query += """
+             ORDER BY COALESCE(updated_at, created_at) DESC, id DESC
+             LIMIT ?
+             """
+    args.append(limit + 1)
+
+    projects = db.execute(query, *args)
+    next_cursor = None
+    if len(projects) > limit:
+        projects = projects[:limit]
+        next_cursor = encode_projects_cursor(projects[-1]["last_activity"], projects[-1]["id"])
+    for project in projects:
+        del project["last_activity"]
+    return projects, next_cursor
+
+
+def encode_projects_cursor(last_activity, project_id):
+    """Encode the position after a project as an opaque cursor"""
+    payload = json.dumps([str(last_activity), project_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_projects_cursor(cursor):
+    """Return (last_activity, id) from a cursor, or None if it is malformed"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_activity, project_id = json.loads(payload)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if not isinstance(last_activity, str) or not isinstance(project_id, int):
+        return None
+    return last_activity, project_id
+
+
 @app.route("/login", methods=["POST"])
 def login():
     """Log user in"""
@@ -102,19 +470,23 @@ def login():
         }), 403
     
     try:
-        rows = db.execute("SELECT * FROM users WHERE email = ?", normalized_email)
+        rows = db.execute("SELECT id, password_hash FROM users WHERE email = ?", normalized_email)
         if len(rows) != 1:
             return jsonify({
                 "success": False,
                 "message": "Correo electrónico y/o contraseña incorrectos."
             }), 403
-        elif not check_password_hash(rows[0]["password_hash"], password):
+        elif not password_hasher.verify(rows[0]["password_hash"], password):
             return jsonify({
                 "success": False,
                 "message": "Contraseña incorrecta."
             }), 403
         session["user_id"] = rows[0]["id"]
+        if password_hasher.needs_rehash(rows[0]["password_hash"]):
+            rehash_password(rows[0]["id"], rows[0]["password_hash"], password)
         return jsonify({"success": True})
+    except HasherBusy:
+        return hasher_busy_response()
     except Exception as e:
         return jsonify({"success": False, "message": "Ha ocurrido un error al procesar la solicitud"}), 500
 
@@ -139,8 +511,7 @@ def register():
             emailinfo = validate_email(email, check_deliverability=False)
             normalized_email = emailinfo.normalized
 
-            rows = db.execute("SELECT 1 FROM users WHERE email = ?", normalized_email)
-            if len(rows) != 0:
+            if email_index.contains(normalized_email):
                 errors["registerEmail"] = "Ya existe una cuenta con el correo electrónico introducido"
         except EmailNotValidError:
             errors["registerEmail"] = "Correo electrónico no válido"
@@ -174,14 +545,44 @@ def register():
     try:
         user_id = db.execute(
             "INSERT INTO users (name, email, password_hash) VALUES (?, ?, ?)",
-            name, normalized_email, generate_password_hash(password)
+            name, normalized_email, password_hasher.hash(password)
         )
+        email_index.add(normalized_email)
         session["user_id"] = user_id
         return jsonify({"success": True})
+    except sqlite3.IntegrityError:
+        # Otra petición registró el mismo correo entre la comprobación y el INSERT
+        return jsonify({
+            "success": False,
+            "fieldErrors": {"registerEmail": "Ya existe una cuenta con el correo electrónico introducido"}
+        }), 400
+    except HasherBusy:
+        return hasher_busy_response()
     except Exception as e:
         return jsonify({"success": False, "message": "Ha ocurrido un error al procesar la solicitud"}), 500
 
 
+def rehash_password(user_id, old_hash, password):
+    """Store a hash made with the current method after a successful login
+
+    It is skipped if the hashing queue is busy; the next login will try again.
+    """
+    try:
+        new_hash = password_hasher.hash(password)
+    except HasherBusy:
+        return
+    # Solo si nadie ha cambiado la contraseña mientras tanto
+    db.execute("UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+               new_hash, user_id, old_hash)
+
+
+def hasher_busy_response():
+    """503 sent when too many passwords are waiting to be hashed"""
+    response = jsonify({"success": False, "message": "Servidor ocupado, inténtelo de nuevo en unos segundos"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
 @app.route("/validate-field-public", methods=["POST"])
 def validate_field_public():
     """Validate individual field"""
@@ -204,11 +605,16 @@ def validate_field_public():
         return jsonify({"success": True, "message": ""})
     
     if field == "email":
+        # Limitar por cliente: la respuesta revela si un correo está registrado
+        wait = email_check_limiter.hit(request.remote_addr)
+        if wait:
+            response = jsonify({"success": False, "message": "Demasiadas solicitudes, inténtelo de nuevo en unos segundos"})
+            response.headers["Retry-After"] = str(wait)
+            return response, 429
         try:
             emailinfo = validate_email(value, check_deliverability=False)
             normalized_email = emailinfo.normalized
-            rows = db.execute("SELECT * FROM users WHERE email = ?", normalized_email)
-            if len(rows) != 0:
+            if email_index.contains(normalized_email):
                 return jsonify({"success": False, "message": "Ya existe una cuenta con el correo electrónico introducido"})
             return jsonify({"success": True, "message": ""})
         except EmailNotValidError:
@@ -253,184 +659,75 @@ def validate_field():
     value = data.get("value")
     project_id = data.get("project_id") or ""
 
+    message = project_field_error(field, value, project_id)
+    return jsonify({"success": not message, "message": message})
+
+
+@app.route("/validate-fields", methods=["POST"])
+@login_required
+def validate_fields():
+    """Validate several fields of the project form in one request
+
+    Takes {"fields": {field: value, ...}, "project_id": ...} and answers
+    {"success": ..., "results": {field: {"success": ..., "message": ...}}}.
+    Reference codes are checked in memory, so the only query is the
+    order-number uniqueness check.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "message": "Solicitud inválida"}), 400
+    fields = data.get("fields")
+    project_id = data.get("project_id") or ""
+
+    if not isinstance(fields, dict) or len(fields) > app.config["VALIDATE_FIELDS_MAX"]:
+        return jsonify({"success": False, "message": "Solicitud inválida"}), 400
+
+    reference = reference_data.get()
+    results = {}
+    for field, value in fields.items():
+        message = project_field_error(field, value, project_id, reference)
+        results[field] = {"success": not message, "message": message}
+    return jsonify({"success": all(result["success"] for result in results.values()), "results": results})
+
+
+def project_field_error(field, value, project_id, reference=None):
+    """Return the error message for one field of the project form, or "" if it is valid"""
     if not value:
-        return jsonify({"success": False, "message":"Campo requerido"})
-    
-    elif field == "orderNumber":
-        
+        return "Campo requerido"
+
+    if field == "orderNumber":
+        if not isinstance(value, str):
+            return "Solicitud inválida"
         if not project_id:
             rows = db.execute(
-                "SELECT * FROM projects_test WHERE user_id = ? AND order_number = ?",
+                "SELECT 1 FROM projects_test WHERE user_id = ? AND order_number = ? LIMIT 1",
                 session["user_id"], value
             )
-            if len(rows) != 0:
-                return jsonify({"success": False, "message": "Nº de orden ya en uso"})
-
-            return jsonify({"success": True, "message": ""})
-        
-        if project_id.isdigit():
+        elif str(project_id).isdigit():
             rows = db.execute(
-                "SELECT 1 FROM projects_test WHERE user_id = ? AND order_number = ? AND id != ?",
+                "SELECT 1 FROM projects_test WHERE user_id = ? AND order_number = ? AND id != ? LIMIT 1",
                 session["user_id"], value, int(project_id)
             )
-            if len(rows) != 0:
-                return jsonify({"success": False, "message": "Nº de orden ya en uso"})
-
-        return jsonify({"success": True, "message": ""})
-    
-    elif field == "clientZip" or  field == "liftZip":
-        if not (value.isdigit() and len(value) == 5):
-            return jsonify({"success": False, "message": "El código postal debe tener 5 dígitos"})
-    
-    elif field == "modification_types":   
-        
-        # Verificar que los códigos existan en la base de datos
-        try:
-            placeholders = ','.join('?' * len(value))
-            rows = db.execute(f"SELECT code FROM {field} WHERE code IN ({placeholders})", *value)
-            if len(rows) != len(value):
-                return jsonify({"success": False, "message": "Tipo de modificación inválido"})
-        except Exception:
-            return jsonify({"success": False, "message": "Error al validar tipos de modificación"})
-
-    elif field == "applicable_norms":
-
-        try:
-            placeholders = ','.join('?' * len(value))
-            rows = db.execute(f"SELECT code FROM {field} WHERE code IN ({placeholders})", *value)
-            if len(rows) != len(value):
-                return jsonify({"success": False, "message": "Normativa aplicable inválida"})
-        except Exception:
-            return jsonify({"success": False, "message": "Error al validar normativas aplicables"})
-    
-    elif field == "legalization_process":
+        else:
+            rows = []
+        return "Nº de orden ya en uso" if len(rows) != 0 else ""
 
-        try:
-            rows = db.execute(f"SELECT code FROM legalization_process WHERE code = ?", value)
-            if len(rows) != len(value):
-                return jsonify({"success": False, "message": "Proceso de legalización inválido"})
-        except Exception:
-            return jsonify({"success": False, "message": "Error al validar el proceso de legalización"})
-    
-    return jsonify({"success": True, "message": ""})
+    return project_form.check(field, value, reference or reference_data.get()) or ""
 
 @app.route("/add-project", methods=["POST"])
 @login_required
 def add_project():
     """Add new project"""
-    order = request.form.get("orderNumber").strip()
-    rae = request.form.get("rae").strip()
-    client_name = request.form.get("clientName").strip()
-    client_nif = request.form.get("clientNIF").strip()
-    client_address = request.form.get("clientAddress").strip()
-    client_city = request.form.get("clientCity").strip()
-    client_zip = request.form.get("clientZip").strip()
-    lift_address = request.form.get("liftAddress").strip()
-    lift_city = request.form.get("liftCity").strip()
-    lift_zip = request.form.get("liftZip").strip()
-    mod_types = request.form.getlist('modification_types')
-    norms = request.form.getlist('applicable_norms')
-    process = request.form.get('legalization_process')
-    exam_type = request.form.get(('examType').strip() or "")
-    oca = request.form.get(('oca').strip() or "")
-    qms = request.form.get(('qualityManagementSystem').strip() or "")
-    nominal_load = request.form.get(("nominalLoad").strip() or "")
-    speed = request.form.get(("speed").strip() or "")
-    machine_room = request.form.get(("machineRoomInput").strip() or "")
-    passengers = request.form.get(("passengers").strip() or "")
-    control_system = request.form.get(("controlSystemInput").strip() or "")
-    cab_dimensions = request.form.get(("cabDimensions").strip() or "")
-    stops = request.form.get(("stops").strip() or "")
-    nominal_tension = request.form.get(("nominalTensionInput").strip() or "")
-    door_type = request.form.get(("doorTypeInput").strip() or "")
-    travel = request.form.get(("travel").strip() or "")
-    nominal_power = request.form.get(("nominalPower").strip() or "")
-    door_size = request.form.get(("doorSize").strip() or "")
-    num_cable = request.form.get(("numCable").strip() or "")
-    nominal_intensity = request.form.get(("nominalIntensity").strip() or "")
-    cable_diameter = request.form.get(("cableDiameterInput").strip() or "")
-    ratio = request.form.get(("ratioInput").strip() or "")
-    cab_mass = request.form.get(("cabMass").strip() or "")
-    cab_rails = request.form.get(("cabRailsInput").strip() or "")
-    cw_mass = request.form.get(("cwMass").strip() or "")
-    cw_rails = request.form.get(("cwRailsInput").strip() or "")
-    locking_device1 = request.form.get(("lockingDevice1Input").strip() or "")
-    locking_device2 = request.form.get(("lockingDevice2Input").strip() or "")
-    machine_brake = request.form.get(("machineBrakeInput").strip() or "")
-    cab_parachute = request.form.get(("cabParachuteInput").strip() or "")
-    cw_parachute = request.form.get(("cwParachuteInput").strip() or "")
-    cab_speed_governor = request.form.get(("cabSpeedGovernorInput").strip() or "")
-    cw_speed_governor = request.form.get(("cwSpeedGovernorInput").strip() or "")
-    cab_buffer = request.form.get(("cabBufferInput").strip() or "")
-    cw_buffer = request.form.get(("cwBufferInput").strip() or "")
-    safety_circuit = request.form.get(("safetyCircuitInput").strip() or "")
-    ucm_detect = request.form.get(("ucmDETECTInput").strip() or "")
-    ucm_act = request.form.get(("ucmACTInput").strip() or "")
-    ucm_stop = request.form.get(("ucmSTOPInput").strip() or "")
-    errors = {}
+    reference = reference_data.get()
+    values, links, errors = project_form.parse(request.form, reference)
 
-    if not order:
-        errors["orderNumber"] = "Campo requerido"
-    else:
+    if "orderNumber" not in errors:
         rows = db.execute(
-            "SELECT * FROM projects_test WHERE user_id = ? AND order_number = ?",
-            session["user_id"], order
+            "SELECT 1 FROM projects_test WHERE user_id = ? AND order_number = ? LIMIT 1",
+            session["user_id"], values["order_number"]
         )
         if len(rows) != 0:
             errors["orderNumber"] = "Nº de orden ya en uso"
-    
-    if not rae:
-        errors["rae"] = "Campo requerido"
-    
-    if not client_name:
-        errors["clientName"] = "Campo requerido"
-    
-    if not client_nif:
-        errors["clientNIF"] = "Campo requerido"
-    if not client_address:
-        errors["clientAddress"] = "Campo requerido"
-    
-    if not client_city:
-        errors["clientCity"] = "Campo requerido"
-    
-    if not client_zip:
-        errors["clientZip"] = "Campo requerido"
-    elif not (client_zip.isdigit() and len(client_zip) == 5):
-        errors["clientZip"] = "El código postal debe tener 5 dígitos"
-    
-    if not lift_address:
-        errors["liftAddress"] = "Campo requerido"
-
-    if not lift_city:
-        errors["liftCity"] = "Campo requerido"
-    
-    if not lift_zip:
-        errors["liftZip"] = "Campo requerido"
-    elif not (lift_zip.isdigit() and len(lift_zip) == 5):
-        errors["liftZip"] = "El código postal debe tener 5 dígitos" 
-
-    if not mod_types:
-        errors["ModificationTypesInput"] = "Campo requerido"   
-    else:
-        placeholders = ','.join('?' *  len(mod_types))
-        rows = db.execute(f"SELECT code FROM modification_types WHERE code IN ({placeholders})", *mod_types)
-        if len(rows) != len(mod_types):
-            errors["ModificationTypesInput"] = "Tipo de modificación inválido" 
-
-    if not norms:
-        errors["AplicableNormsInput"] = "Campo requerido"
-    else:
-        placeholders = ','.join('?' * len(norms))
-        rows = db.execute(f"SELECT code FROM applicable_norms WHERE code IN ({placeholders})", *norms)
-        if len(rows) != len(norms):
-            errors["AplicableNormsInput"] = "Normativa aplicable inválida"
-    
-    if not process:
-        errors["LegalizationProcessInput"] = "Campo requerido"
-    else:
-        rows = db.execute("SELECT code FROM legalization_process WHERE code = ?", process)
-        if len(rows) != 1:
-            errors["LegalizationProcessInput"] = "Proceso de legalización inválido"
 
     if errors:
         return jsonify({
@@ -439,196 +736,56 @@ def add_project():
         }), 400
     
     try:
-        project_id = db.execute("""
-            INSERT INTO projects_test (user_id, order_number, rae, client_name, 
-                                    client_nif, client_address, client_city, client_zip, 
-                                    lift_address, lift_city, lift_zip, exam_type, oca, qms,
-                                    nominal_load, speed, machine_room, passengers, control_system,
-                                    cab_dimensions, stops, nominal_tension, door_type, travel,
-                                    nominal_power, door_size, num_cable, nominal_intensity,
-                                    cable_diameter, ratio, cab_mass, cab_rails, cw_mass, cw_rails,
-                                    locking_device1, locking_device2, machine_brake, cab_parachute, cw_parachute,
-                                    cab_speed_governor, cw_speed_governor, cab_buffer, cw_buffer, safety_circuit,
-                                    ucm_detect, ucm_act, ucm_stop,
-                                    created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-                    ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """,    session["user_id"], order, rae, client_name, client_nif, client_address, 
-                client_city, client_zip, lift_address, lift_city, lift_zip, exam_type, oca, qms,
-                nominal_load, speed, machine_room, passengers, control_system, cab_dimensions, stops,
-                nominal_tension, door_type, travel, nominal_power, door_size, num_cable, nominal_intensity,
-                cable_diameter, ratio, cab_mass, cab_rails, cw_mass, cw_rails, locking_device1, locking_device2,
-                machine_brake, cab_parachute, cw_parachute, cab_speed_governor, cw_speed_governor, cab_buffer, cw_buffer, 
-                safety_circuit, ucm_detect, ucm_act, ucm_stop)
-
-        if mod_types:
-            placeholders = ','.join('?' * len(mod_types))
-            rows = db.execute(f"SELECT id, code FROM modification_types WHERE code IN ({placeholders})", *mod_types)
-            code_to_id = {row['code']: row['id'] for row in rows}
-
-            for code in mod_types:
-                mt_id = code_to_id[code]
-                db.execute("INSERT INTO project_modification_types (project_id,modification_type_id) VALUES (?, ?)",
-                           project_id, mt_id)
-
-        if norms:
-            placeholders = ','.join('?' * len(norms))
-            rows = db.execute(f"SELECT id, code FROM applicable_norms WHERE code IN ({placeholders})", *norms)
-            norm_code_to_id = {row['code']: row['id'] for row in rows}
-            
-            for code in norms:
-                norm_id = norm_code_to_id[code]
-                db.execute("INSERT INTO project_applicable_norms (project_id,applicable_norm_id) VALUES (?, ?)",
-                           project_id, norm_id)
-        
-        if process:
-            rows = db.execute("SELECT id FROM legalization_process WHERE code = ?", process)
-            process_id = rows[0]['id']
-
-            db.execute("INSERT INTO project_legalization_process (project_id, legalization_process_id) VALUES (?, ?)",
-                       project_id, process_id)
-        
-        new_project = db.execute(
-            """SELECT id, order_number, rae, lift_address, created_at, updated_at
-            FROM projects_test WHERE id = ?""",
-            project_id
-        )[0]
+        with db.transaction():
+            project_id = db.execute(project_form.insert_sql,
+                                    *project_form.insert_params(session["user_id"], values))
+            save_project_links(project_id, links, reference)
+
+            new_project = db.execute(
+                """SELECT id, order_number, rae, lift_address, created_at, updated_at
+                FROM projects_test WHERE id = ?""",
+                project_id
+            )[0]
+
+        if pdf_prerenderer:
+            pdf_prerenderer.schedule(project_id, session["user_id"])
         return jsonify({"success": True, "project": new_project})
     
+    except sqlite3.IntegrityError:
+        # Otra petición guardó el mismo nº de orden entre la comprobación y la escritura
+        return jsonify({
+            "success": False,
+            "fieldErrors": {"orderNumber": "Nº de orden ya en uso"}
+        }), 400
     except Exception as e:
         return jsonify({"success": False, "message": "Ha ocurrido un error al procesar su solicitud"}), 500
 
 @app.route("/update-project", methods=["POST"])
 @login_required
 def update_project():
-    """Add new project"""
-    project_id = request.form.get("id").strip()
-    order = request.form.get("orderNumber").strip()
-    rae = request.form.get("rae").strip()
-    client_name = request.form.get("clientName").strip()
-    client_nif = request.form.get("clientNIF").strip()
-    client_address = request.form.get("clientAddress").strip()
-    client_city = request.form.get("clientCity").strip()
-    client_zip = request.form.get("clientZip").strip()
-    lift_address = request.form.get("liftAddress").strip()
-    lift_city = request.form.get("liftCity").strip()
-    lift_zip = request.form.get("liftZip").strip()
-    mod_types = request.form.getlist('modification_types')
-    norms = request.form.getlist('applicable_norms')
-    process = request.form.get('legalization_process')
-    exam_type = request.form.get(("examType").strip() or "")
-    oca = request.form.get(("oca").strip() or "")
-    qms = request.form.get(("qualityManagementSystem").strip() or "")
-    nominal_load = request.form.get(("nominalLoad").strip() or "")
-    speed = request.form.get(("speed").strip() or "")
-    machine_room = request.form.get(("machineRoomInput").strip() or "")
-    passengers = request.form.get(("passengers").strip() or "")
-    control_system = request.form.get(("controlSystemInput").strip() or "")
-    cab_dimensions = request.form.get(("cabDimensions").strip() or "")
-    stops = request.form.get(("stops").strip() or "")
-    nominal_tension = request.form.get(("nominalTensionInput").strip() or "")
-    door_type = request.form.get(("doorTypeInput").strip() or "")
-    travel = request.form.get(("travel").strip() or "")
-    nominal_power = request.form.get(("nominalPower").strip() or "")
-    door_size = request.form.get(("doorSize").strip() or "")
-    num_cable = request.form.get(("numCable").strip() or "")
-    nominal_intensity = request.form.get(("nominalIntensity").strip() or "")
-    cable_diameter = request.form.get(("cableDiameterInput").strip() or "")
-    ratio = request.form.get(("ratioInput").strip() or "")
-    cab_mass = request.form.get(("cabMass").strip() or "")
-    cab_rails = request.form.get(("cabRailsInput").strip() or "")
-    cw_mass = request.form.get(("cwMass").strip() or "")
-    cw_rails = request.form.get(("cwRailsInput").strip() or "")
-    locking_device1 = request.form.get(("lockingDevice1Input").strip() or "")
-    locking_device2 = request.form.get(("lockingDevice2Input").strip() or "")
-    machine_brake = request.form.get(("machineBrakeInput").strip() or "")
-    cab_parachute = request.form.get(("cabParachuteInput").strip() or "")
-    cw_parachute = request.form.get(("cwParachuteInput").strip() or "")
-    cab_speed_governor = request.form.get(("cabSpeedGovernorInput").strip() or "")
-    cw_speed_governor = request.form.get(("cwSpeedGovernorInput").strip() or "")
-    cab_buffer = request.form.get(("cabBufferInput").strip() or "")
-    cw_buffer = request.form.get(("cwBufferInput").strip() or "")
-    safety_circuit = request.form.get(("safetyCircuitInput").strip() or "")
-    ucm_detect = request.form.get(("ucmDETECTInput").strip() or "")
-    ucm_act = request.form.get(("ucmACTInput").strip() or "")
-    ucm_stop = request.form.get(("ucmSTOPInput").strip() or "")
-
-    errors = {}
+    """Update an existing project"""
+    project_id = (request.form.get("id") or "").strip()
 
     if not project_id or not project_id.isdigit():
         return jsonify({"success": False, "message": "Solicitud inválida"}), 400
+    project_id = int(project_id)
     # Confirmar que existe y pertenece al usuario
     rows = db.execute("SELECT 1 FROM projects_test WHERE id = ? AND user_id = ? LIMIT 1",
-                      int(project_id), session["user_id"])
+                      project_id, session["user_id"])
     if len(rows) == 0:
         return jsonify({"success": False, "message": "Proyecto no encontrado"}), 404
 
-    if not order:
-        errors["orderNumber"] = "Campo requerido"
-    else:
+    reference = reference_data.get()
+    values, links, errors = project_form.parse(request.form, reference)
+
+    if "orderNumber" not in errors:
         rows = db.execute(
-            "SELECT 1 FROM projects_test WHERE user_id = ? AND order_number = ? AND id != ?",
-            session["user_id"], order, int(project_id)
+            "SELECT 1 FROM projects_test WHERE user_id = ? AND order_number = ? AND id != ? LIMIT 1",
+            session["user_id"], values["order_number"], project_id
         )
         if len(rows) != 0:
             errors["orderNumber"] = "Nº de orden ya en uso"
-    
-    if not rae:
-        errors["rae"] = "Campo requerido"
-    
-    if not client_name:
-        errors["clientName"] = "Campo requerido"
-    
-    if not client_nif:
-        errors["clientNIF"] = "Campo requerido"
-    if not client_address:
-        errors["clientAddress"] = "Campo requerido"
-    
-    if not client_city:
-        errors["clientCity"] = "Campo requerido"
-    
-    if not client_zip:
-        errors["clientZip"] = "Campo requerido"
-    elif not (client_zip.isdigit() and len(client_zip) == 5):
-        errors["clientZip"] = "El código postal debe tener 5 dígitos"
-    
-    if not lift_address:
-        errors["liftAddress"] = "Campo requerido"
 
-    if not lift_city:
-        errors["liftCity"] = "Campo requerido"
-    
-    if not lift_zip:
-        errors["liftZip"] = "Campo requerido"
-    elif not (lift_zip.isdigit() and len(lift_zip) == 5):
-        errors["liftZip"] = "El código postal debe tener 5 dígitos"    
-    
-    if not mod_types:
-        errors["ModificationTypesInput"] = "Campo requerido"
-    else:
-        placeholders = ','.join('?' * len(mod_types))
-        rows = db.execute(f"SELECT code FROM modification_types WHERE code IN ({placeholders})", *mod_types)
-        if len(rows) != len(mod_types):
-            errors["ModificationTypesInput"] = "Tipo de modificación inválido"
-    
-    if not norms:
-        errors["AplicableNormsInput"] = "Campo requerido"
-    else:
-        placeholders = ','.join('?' * len(norms))
-        rows = db.execute(f"SELECT code FROM applicable_norms WHERE code IN ({placeholders})", *norms)
-        if len(rows) != len(norms):
-            errors["AplicableNormsInput"] = "Normativa aplicable inválido"
-    
-    if not process:
-        errors["LegalizationProcessInput"] = "Campo requerido"
-    else:
-        rows = db.execute("SELECT code FROM legalization_process WHERE code = ?", process)
-        if len(rows) != 1:
-            errors["LegalizationProcessInput"] = "Proceso de legalización inválido"
-    
     if errors:
         return jsonify({
             "success": False,
@@ -636,149 +793,63 @@ def update_project():
         }), 400
 
     try:
-        db.execute(
-            """
-            UPDATE projects_test
-            SET order_number = ?,
-                rae = ?,
-                client_name = ?,
-                client_nif = ?,
-                client_address = ?,
-                client_city = ?,
-                client_zip = ?,
-                lift_address = ?,
-                lift_city = ?,
-                lift_zip = ?,
-                exam_type = ?,
-                oca = ?,
-                qms = ?,
-                nominal_load = ?,
-                speed = ?,
-                machine_room = ?,
-                passengers = ?,
-                control_system = ?,
-                cab_dimensions = ?,
-                stops = ?,
-                nominal_tension = ?,
-                door_type = ?,
-                travel = ?,
-                nominal_power = ?,
-                door_size = ?,
-                num_cable = ?,
-                nominal_intensity = ?,
-                cable_diameter = ?,
-                ratio = ?,
-                cab_mass = ?,
-                cab_rails = ?,
-                cw_mass = ?,
-                cw_rails = ?,
-                locking_device1 = ?,
-                locking_device2 = ?,
-                machine_brake = ?,
-                cab_parachute = ?,
-                cw_parachute = ?,
-                cab_speed_governor = ?,
-                cw_speed_governor = ?,
-                cab_buffer = ?,
-                cw_buffer = ?,
-                safety_circuit = ?,
-                ucm_detect = ?,
-                ucm_act = ?,
-                ucm_stop = ?,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-            """,
-            order,
-            rae,
-            client_name,
-            client_nif,
-            client_address,
-            client_city,
-            client_zip,
-            lift_address,
-            lift_city,
-            lift_zip,
-            exam_type,
-            oca,
-            qms,
-            nominal_load,
-            speed,
-            machine_room,
-            passengers,
-            control_system,
-            cab_dimensions,
-            stops,
-            nominal_tension,
-            door_type,
-            travel,
-            nominal_power,
-            door_size,
-            num_cable,
-            nominal_intensity,
-            cable_diameter,
-            ratio,
-            cab_mass,
-            cab_rails,
-            cw_mass,
-            cw_rails,
-            locking_device1,
-            locking_device2,
-            machine_brake,
-            cab_parachute,
-            cw_parachute,
-            cab_speed_governor,
-            cw_speed_governor,
-            cab_buffer,
-            cw_buffer,
-            safety_circuit,
-            ucm_detect,
-            ucm_act,
-            ucm_stop,
-            int(project_id),
-        )
-
-        if mod_types:
-            db.execute("DELETE FROM project_modification_types WHERE project_id = ?", project_id)
-            placeholders = ','.join('?' * len(mod_types))
-            rows = db.execute(f"SELECT id, code FROM modification_types WHERE code IN ({placeholders})", *mod_types)
-            code_to_id = {row['code']: row['id'] for row in rows}
-
-            for code in mod_types:
-                mt_id = code_to_id[code]
-                db.execute("INSERT INTO project_modification_types (project_id,modification_type_id) VALUES (?, ?)",
-                           project_id, mt_id)
-
-        if norms:
-            db.execute("DELETE FROM project_applicable_norms WHERE project_id = ?", project_id)
-            placeholders = ','.join('?' * len(norms))
-            rows = db.execute(f"SELECT id, code FROM applicable_norms WHERE code IN ({placeholders})", *norms)
-            norm_code_to_id = {row['code']: row['id'] for row in rows}
-
-            for code in norms:
-                norm_id = norm_code_to_id[code]
-                db.execute("INSERT INTO project_applicable_norms (project_id,applicable_norm_id) VALUES (?, ?)",
-                           project_id, norm_id)
-                  
-        if process:
-            db.execute("DELETE FROM project_legalization_process WHERE project_id = ?", project_id)
-            rows = db.execute("SELECT id FROM legalization_process WHERE code = ?", process)
-            process_id = rows[0]['id']
-
-            db.execute("INSERT INTO project_legalization_process (project_id, legalization_process_id) VALUES (?, ?)",
-                       project_id, process_id)
-
-        updated_project = db.execute(
-            """
-            SELECT id, order_number, rae, lift_address, created_at, updated_at
-            FROM projects_test WHERE id = ?
-            """,
-            int(project_id),
-        )[0]
+        with db.transaction():
+            db.execute(project_form.update_sql, *project_form.update_params(values, project_id))
+            save_project_links(project_id, links, reference)
+
+            updated_project = db.execute(
+                """
+                SELECT id, order_number, rae, lift_address, created_at, updated_at
+                FROM projects_test WHERE id = ?
+                """,
+                project_id,
+            )[0]
+
+        if pdf_prerenderer:
+            pdf_prerenderer.schedule(project_id, session["user_id"])
         return jsonify({"success": True, "project": updated_project})
     
+    except sqlite3.IntegrityError:
+        # Otra petición guardó el mismo nº de orden entre la comprobación y la escritura
+        return jsonify({
+            "success": False,
+            "fieldErrors": {"orderNumber": "Nº de orden ya en uso"}
+        }), 400
     except Exception as e:
         return jsonify({"success": False, "message": "Ha ocurrido un error al procesar su solicitud"}), 500
 
+
+def save_project_links(project_id, links, reference):
+    """Write the codes parsed from the form into the project's junction tables"""
+    for link in project_form.links:
+        sync_project_links(project_id, link.link_table, link.link_column,
+                           getattr(reference, link.reference), links[link.reference])
+
+
+def sync_project_links(project_id, link_table, link_column, table, codes):
+    """Make a project's rows in a junction table match a list of codes
+
+    Only the difference is written: one DELETE for the codes that were
+    removed and one multi-row INSERT for the ones that were added.
+    """
+    wanted = {table.code_to_id[code] for code in codes}
+
+    rows = db.execute(f"SELECT {link_column} AS id FROM {link_table} WHERE project_id = ?", project_id)
+    current = {row["id"] for row in rows}
+
+    removed = sorted(current - wanted)
+    if removed:
+        placeholders = ",".join("?" * len(removed))
+        db.execute(f"DELETE FROM {link_table} WHERE project_id = ? AND {link_column} IN ({placeholders})",
+                   project_id, *removed)
+
+    added = sorted(wanted - current)
+    if added:
+        values = ",".join("(?, ?)" for _ in added)
+        db.execute(f"INSERT INTO {link_table} (project_id, {link_column}) VALUES {values}",
+                   *[arg for ref_id in added for arg in (project_id, ref_id)])
+
+
 @app.route("/delete-project", methods=["POST"])
 @login_required
 def delete_project():
@@ -806,60 +877,22 @@ def get_project():
     data = request.get_json()
     project_id = data.get('projectId')
 
-    text_fields = ["order_number", "rae", "client_name", "client_nif", "client_address",
-                 "client_city", "client_zip", "lift_address", "lift_city", "lift_zip", 
-                 "exam_type", "oca", "qms", "nominal_load", "speed", "machine_room", "passengers",
-                 "control_system", "cab_dimensions", "stops", "nominal_tension", "door_type", "travel",
-                 "nominal_power", "door_size", "num_cable", "nominal_intensity", "cable_diameter", "ratio",
-                 "cab_mass", "cab_rails", "cw_mass", "cw_rails", "locking_device1", "locking_device2", "machine_brake",
-                 "cab_parachute", "cw_parachute", "cab_speed_governor", "cw_speed_governor", "cab_buffer", "cw_buffer", 
-                 "safety_circuit", "ucm_detect", "ucm_act", "ucm_stop"]
-    
     if not project_id or not project_id.isdigit():
         return jsonify({"success": False, "message": "Solicitud inválida"}), 400
     # Confirmar que existe y pertenece al usuario
-    rows = db.execute("SELECT 1 FROM projects_test WHERE id = ? AND user_id = ? LIMIT 1",
-                      int(project_id), session["user_id"])
-    if len(rows) == 0:
+    project = load_project(project_id, session["user_id"])
+    if project is None:
         return jsonify({"success": False, "message": "Proyecto no encontrado"}), 404
     try:
-        project_data = db.execute(
-            """SELECT id, order_number, rae, client_name,
-            client_nif, client_address, client_city, client_zip,
-            lift_address, lift_city, lift_zip, exam_type, oca, qms,
-            nominal_load, speed, machine_room, passengers, control_system,
-            cab_dimensions, stops, nominal_tension, door_type, travel,
-            nominal_power, door_size, num_cable, nominal_intensity,
-            cable_diameter, ratio, cab_mass, cab_rails, cw_mass, cw_rails, locking_device1, locking_device2, machine_brake,
-            cab_parachute, cw_parachute, cab_speed_governor, cw_speed_governor, cab_buffer, cw_buffer, safety_circuit,
-            ucm_detect, ucm_act, ucm_stop FROM projects_test 
-            WHERE id = ? AND user_id = ?""",
-            project_id, session["user_id"]
-        )[0]
-
-        modification_types = db.execute(
-            """SELECT code 
-            FROM modification_types
-            JOIN project_modification_types ON modification_types.id = project_modification_types.modification_type_id
-            WHERE project_modification_types.project_id = ?""", project_id
-        )
-
-        applicable_norms = db.execute(
-            """SELECT code 
-            FROM applicable_norms
-            JOIN project_applicable_norms ON applicable_norms.id = project_applicable_norms.applicable_norm_id
-            WHERE project_applicable_norms.project_id = ?""", project_id
-        )
+        project_row, modification_types, applicable_norms, legalization_process = project
+        project_data = {field: value for field, value in project_row.items()
+                        if field not in ("created_at", "updated_at")}
+        modification_types = [{"code": link["code"]} for link in modification_types]
+        applicable_norms = [{"code": link["code"]} for link in applicable_norms]
+        legalization_process = [{"code": link["code"]} for link in legalization_process]
 
-        legalization_process = db.execute(
-            """SELECT code 
-            FROM legalization_process
-            JOIN project_legalization_process ON legalization_process.id = project_legalization_process.legalization_process_id
-            WHERE project_legalization_process.project_id = ?""", project_id
-        )
-        
         # Sanitizar campos de texto de forma segura
-        for field in text_fields:
+        for field in project_form.columns:
             if field in project_data and project_data[field] is not None:
                 project_data[field] = html.escape(str(project_data[field]))
 
@@ -876,103 +909,386 @@ def get_project():
 @login_required
 def generate_pdf(project_id):
     """Generate PDF"""
-    text_fields = ["order_number", "rae", "client_name", "client_nif", "client_address",
-                 "client_city", "client_zip", "lift_address", "lift_city", "lift_zip", 
-                 "exam_type", "oca", "qms", "nominal_load", "speed", "machine_room", "passengers",
-                 "control_system", "cab_dimensions", "stops", "nominal_tension", "door_type", "travel",
-                 "nominal_power", "door_size", "num_cable", "nominal_intensity", "cable_diameter", "ratio",
-                 "cab_mass", "cab_rails", "cw_mass", "cw_rails", "locking_device1", "locking_device2", "machine_brake",
-                 "cab_parachute", "cw_parachute", "cab_speed_governor", "cw_speed_governor", "cab_buffer", "cw_buffer", 
-                 "safety_circuit", "ucm_detect", "ucm_act", "ucm_stop"]
-    
     # Confirmar que existe y pertenece al usuario
-    rows = db.execute("SELECT 1 FROM projects_test WHERE id = ? AND user_id = ? LIMIT 1",
-                      int(project_id), session["user_id"])
-    if len(rows) == 0:
+    if load_project(project_id, session["user_id"]) is None:
         return jsonify({"success": False, "message": "Proyecto no encontrado"}), 404
     try:
-        project_data = db.execute(
-            """SELECT id, order_number, rae, client_name,
-            client_nif, client_address, client_city, client_zip,
-            lift_address, lift_city, lift_zip, exam_type, oca, qms,
-            nominal_load, speed, machine_room, passengers, control_system,
-            cab_dimensions, stops, nominal_tension, door_type, travel,
-            nominal_power, door_size, num_cable, nominal_intensity,
-            cable_diameter, ratio, cab_mass, cab_rails, cw_mass, cw_rails, locking_device1, locking_device2, machine_brake,
-            cab_parachute, cw_parachute, cab_speed_governor, cw_speed_governor, cab_buffer, cw_buffer, safety_circuit,
-            ucm_detect, ucm_act, ucm_stop, created_at, updated_at FROM projects_test 
-            WHERE id = ? AND user_id = ?""",
-            project_id, session["user_id"]
-        )[0]
-        if project_data.get('created_at'):
-            try:
-                project_data['created_at'] = datetime.fromisoformat(project_data['created_at'].replace('Z', '+00:00'))
-            except:
-                project_data['created_at'] = datetime.now()
-
-        if project_data.get('updated_at'):
-            try:
-                project_data['updated_at'] = datetime.fromisoformat(project_data['updated_at'].replace('Z', '+00:00'))
-            except:
-                project_data['updated_at'] = project_data['created_at']
-
-        modification_types = db.execute(
-            """SELECT code, label
-            FROM modification_types
-            JOIN project_modification_types ON modification_types.id = project_modification_types.modification_type_id
-            WHERE project_modification_types.project_id = ?""", project_id
-        )
+        cache_key, project_data = load_pdf_project(project_id, session["user_id"])
+
+        g.cache_control = "private, no-cache"
+        if request.if_none_match.contains(cache_key):
+            response = make_response("", 304)
+            response.set_etag(cache_key)
+            return response
 
-        applicable_norms = db.execute(
-            """SELECT code, label
-            FROM applicable_norms
-            JOIN project_applicable_norms ON applicable_norms.id = project_applicable_norms.applicable_norm_id
-            WHERE project_applicable_norms.project_id = ?""", project_id
+        path = pdf_cache.path_or_render(
+            cache_key, lambda target: render_pdf_file(render_pdf_content(project_data), target)
         )
+        return pdf_response(path, cache_key, project_data["order_number"])
+
+    except Exception as e:
+        g.cache_control = None
+        logger.error(f"Error generando PDF para proyecto {project_id}: {e}")
+        return jsonify({"success": False, "message": "Ha ocurrido un error al procesar su solicitud"}), 500
+
+
+@app.route("/generate-pdf/<int:project_id>/jobs", methods=["POST"])
+@login_required
+def submit_pdf_job(project_id):
+    """Queue a PDF render in the background worker pool"""
+    if pdf_workers is None:
+        return jsonify({"success": False, "message": "Generación en segundo plano no disponible"}), 404
 
-        legalization_process = db.execute(
-            """SELECT code, label
-            FROM legalization_process
-            JOIN project_legalization_process ON legalization_process.id = project_legalization_process.legalization_process_id
-            WHERE project_legalization_process.project_id = ?""", project_id
+    # Confirmar que existe y pertenece al usuario
+    if load_project(project_id, session["user_id"]) is None:
+        return jsonify({"success": False, "message": "Proyecto no encontrado"}), 404
+    try:
+        cache_key, project_data = load_pdf_project(project_id, session["user_id"])
+        job = pdf_workers.submit(
+            session["user_id"], cache_key, project_data["order_number"],
+            lambda: render_pdf_content(project_data), pdf_css_path()
         )
-        
+        return jsonify({"success": True, "job": job}), 202
 
-        # Sanitizar campos de texto de forma segura
-        for field in text_fields:
-            if field in project_data and project_data[field] is not None:
-                project_data[field] = html.escape(str(project_data[field]))
+    except Exception as e:
+        logger.error(f"Error encolando PDF para proyecto {project_id}: {e}")
+        return jsonify({"success": False, "message": "Ha ocurrido un error al procesar su solicitud"}), 500
 
-        project_data["modification_types"] = modification_types if modification_types else []
-        project_data["applicable_norms"] = applicable_norms if applicable_norms else []
-        project_data["legalization_process"] = legalization_process if legalization_process else []
-        project_data["mod_codes"] = [mod['code'] for mod in modification_types]
-        project_data["process_codes"] = [legalization['code'] for legalization in legalization_process]
 
-        html_content = render_template("pdf/documento.html", project_data=project_data)
-        
-        import os 
-        css_path = os.path.join(app.static_folder, 'pdf', 'styles.css')
-  
-        font_config = FontConfiguration()
-        pdf = HTML(string=html_content).write_pdf(
-            stylesheets=[CSS(filename=css_path)],
-            font_config=font_config
+@app.route("/generate-pdf/batch", methods=["POST"])
+@login_required
+def generate_pdf_batch():
+    """Generate the PDFs of several projects as a streamed ZIP"""
+    data = request.get_json(silent=True) or {}
+    project_ids = data.get("ids")
+    filters = data.get("filter") or {}
+    user_id = session["user_id"]
+    if not isinstance(filters, dict):
+        return jsonify({"success": False, "message": "Solicitud inválida"}), 400
+
+    if project_ids is not None:
+        if (not isinstance(project_ids, list) or not project_ids
+                or not all(isinstance(pid, int) or (isinstance(pid, str) and pid.isdigit()) for pid in project_ids)):
+            return jsonify({"success": False, "message": "Solicitud inválida"}), 400
+        project_ids = list(dict.fromkeys(int(pid) for pid in project_ids))
+        if len(project_ids) > app.config["PDF_BATCH_MAX_PROJECTS"]:
+            return jsonify({"success": False, "message": "Demasiados proyectos en una sola descarga"}), 400
+
+        # Confirmar que existen y pertenecen al usuario
+        placeholders = ','.join('?' * len(project_ids))
+        rows = db.execute(f"SELECT id FROM projects_test WHERE user_id = ? AND id IN ({placeholders})",
+                          user_id, *project_ids)
+        if len(rows) != len(project_ids):
+            return jsonify({"success": False, "message": "Proyecto no encontrado"}), 404
+    else:
+        conditions = ["user_id = ?"]
+        args = [user_id]
+        if filters.get("from"):
+            conditions.append("COALESCE(updated_at, created_at) >= ?")
+            args.append(filters["from"])
+        if filters.get("to"):
+            conditions.append("COALESCE(updated_at, created_at) < date(?, '+1 day')")
+            args.append(filters["to"])
+        if filters.get("status"):
+            conditions.append("status = ?")
+            args.append(filters["status"])
+        rows = db.execute(
+            f"""SELECT id FROM projects_test WHERE {' AND '.join(conditions)}
+            ORDER BY COALESCE(updated_at, created_at) DESC, id DESC LIMIT ?""",
+            *args, app.config["PDF_BATCH_MAX_PROJECTS"] + 1
         )
+        if len(rows) > app.config["PDF_BATCH_MAX_PROJECTS"]:
+            return jsonify({"success": False, "message": "Demasiados proyectos en una sola descarga"}), 400
+        project_ids = [row["id"] for row in rows]
+
+    if not project_ids:
+        return jsonify({"success": False, "message": "No hay proyectos que descargar"}), 404
+
+    def entries():
+        # Sin pasar por load_project: g.projects retendría todos los proyectos hasta acabar el ZIP
+        for project_id in project_ids:
+            loaded = fetch_project(project_id, user_id)
+            if loaded is None:
+                # Borrado mientras se generaba la descarga
+                yield f"proyecto {project_id} (eliminado)", None, None
+                continue
+            cache_key, project_data = prepare_pdf_project(*loaded)
+            yield (f'proyecto_{project_data["order_number"]}.pdf', cache_key,
+                   partial(render_pdf_content, project_data))
+
+    stream = pdf_batch.stream_pdf_zip(entries(), pdf_cache, pdf_css_path(), pdf_executor(),
+                                      app.config["PDF_BATCH_PROCESSES"] * 2)
+
+    response = Response(stream_with_context(stream), mimetype="application/zip")
+    response.headers["Content-Disposition"] = 'attachment; filename="proyectos.zip"'
+    return response
 
-        response = make_response(pdf)
-        response.headers["Content-Type"] = "application/pdf"
-        response.headers["Content-Disposition"] = f'inline; filename="proyecto_{project_data["order_number"]}.pdf"'
 
+@app.route("/pdf-jobs/<job_id>")
+@login_required
+def pdf_job_status(job_id):
+    """Get the status of a background PDF render"""
+    job = pdf_workers.status(job_id, session["user_id"]) if pdf_workers else None
+    if job is None:
+        return jsonify({"success": False, "message": "Trabajo no encontrado"}), 404
+    return jsonify({"success": True, "job": job})
+
+
+@app.route("/pdf-jobs/<job_id>/events")
+@login_required
+def pdf_job_events(job_id):
+    """Stream the status of a background PDF render as Server-Sent Events"""
+    user_id = session["user_id"]
+    if pdf_workers is None or pdf_workers.status(job_id, user_id) is None:
+        return jsonify({"success": False, "message": "Trabajo no encontrado"}), 404
+
+    def events():
+        last = None
+        while True:
+            job = pdf_workers.status(job_id, user_id)
+            if job is None:
+                return
+            if job != last:
+                yield f"data: {json.dumps(job)}\n\n"
+                last = job
+            if job["status"] in PdfWorkerPool.FINISHED:
+                return
+            time.sleep(0.5)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream")
+
+
+@app.route("/pdf-jobs/<job_id>/result")
+@login_required
+def pdf_job_result(job_id):
+    """Download the PDF produced by a background render"""
+    job = pdf_workers.status(job_id, session["user_id"]) if pdf_workers else None
+    if job is None:
+        return jsonify({"success": False, "message": "Trabajo no encontrado"}), 404
+    if job["status"] != "done":
+        return jsonify({"success": False, "message": "El PDF todavía no está disponible", "job": job}), 409
+
+    path = pdf_cache.lookup(job["cache_key"])
+    if path is None:
+        return jsonify({"success": False, "message": "El PDF ya no está disponible"}), 410
+
+    g.cache_control = "private, no-cache"
+    return pdf_response(path, job["cache_key"], job["order_number"])
+
+
+def load_pdf_project(project_id, user_id):
+    """Load the data rendered into a project's PDF and its cache key"""
+    return prepare_pdf_project(*load_project(project_id, user_id))
+
+
+def load_project(project_id, user_id):
+    """Return a user's project as (row, modification_types, applicable_norms, legalization_process)
+
+    Returns None if the project doesn't exist or belongs to someone else.
+    The result is kept for the rest of the request, so the ownership check
+    and the later load share one query.
+    """
+    loaded = g.setdefault("projects", {})
+    key = (int(project_id), user_id)
+    if key not in loaded:
+        loaded[key] = fetch_project(project_id, user_id)
+    return loaded[key]
+
+
+def fetch_project(project_id, user_id):
+    """Read a project and the codes and labels of its junction rows in one query
+
+    The junction ids come back as JSON arrays and are mapped to codes and
+    labels through the in-memory reference data.
+    """
+    rows = db.execute(
+        f"""SELECT {project_form.select_columns},
+        {project_form.select_links}
+        FROM projects_test
+        WHERE id = ? AND user_id = ?""",
+        int(project_id), user_id
+    )
+    if len(rows) == 0:
+        return None
+
+    project_row = rows[0]
+    reference = reference_data.get()
+    project = [project_row]
+    for link in project_form.links:
+        table = getattr(reference, link.reference)
+        project.append([{"code": table.id_to_code[ref_id], "label": table.id_to_label[ref_id]}
+                        for ref_id in json.loads(project_row.pop(link.reference))])
+    return tuple(project)
+
+
+def prepare_pdf_project(project_row, modification_types, applicable_norms, legalization_process):
+    """Turn the fetched rows into the PDF template data and its cache key"""
+    # El PDF sólo cambia si cambian los datos, la plantilla o la hoja de estilos
+    template_dir = os.path.join(app.root_path, app.template_folder, 'pdf')
+    cache_key = pdf_cache_key(project_row, modification_types, applicable_norms, legalization_process,
+                              template_dir, pdf_css_path())
+
+    project_data = dict(project_row)
+    if project_data.get('created_at'):
+        try:
+            project_data['created_at'] = datetime.fromisoformat(project_data['created_at'].replace('Z', '+00:00'))
+        except:
+            project_data['created_at'] = datetime.now()
+
+    if project_data.get('updated_at'):
+        try:
+            project_data['updated_at'] = datetime.fromisoformat(project_data['updated_at'].replace('Z', '+00:00'))
+        except:
+            project_data['updated_at'] = project_data['created_at']
+
+    escape_pdf_fields(project_data)
+
+    project_data["modification_types"] = modification_types if modification_types else []
+    project_data["applicable_norms"] = applicable_norms if applicable_norms else []
+    project_data["legalization_process"] = legalization_process if legalization_process else []
+    project_data["mod_codes"] = [mod['code'] for mod in modification_types]
+    project_data["process_codes"] = [legalization['code'] for legalization in legalization_process]
+
+    return cache_key, project_data
+
+
+def escape_pdf_fields(project_data):
+    """Escape the free-text fields shown in the PDF"""
+    # Sanitizar campos de texto de forma segura
+    for field in project_form.columns:
+        if field in project_data and project_data[field] is not None:
+            project_data[field] = html.escape(str(project_data[field]))
+
+
+def render_pdf_html(project_data):
+    """Render the PDF template for a project"""
+    return pdf_templates.render("pdf/documento.html", project_data=project_data)
+
+
+def render_pdf_sections(project_data):
+    """Render each section of the PDF template for a project separately"""
+    return [pdf_templates.render("pdf/seccion.html", project_data=project_data, section=section)
+            for section in PDF_SECTIONS]
+
+
+def render_pdf_content(project_data):
+    """Render what the PDF renderer needs: the sections or the whole document"""
+    if app.config["PDF_SECTION_CACHE"]:
+        return render_pdf_sections(project_data)
+    return render_pdf_html(project_data)
+
+
+def render_pdf_file(html_content, target):
+    """Render a PDF into a cache file, in the shared process pool unless PDF_RENDER_IN_REQUEST"""
+    if app.config["PDF_RENDER_IN_REQUEST"]:
+        render_pdf(html_content, pdf_css_path(), target)
+        return
+    # El proceso del pool escribe el fichero por su ruta: el PDF no pasa por la memoria de este proceso
+    pdf_executor().submit(render_pdf, html_content, pdf_css_path(), target.name).result()
+
+
+def pdf_css_path():
+    """Return the path of the PDF stylesheet"""
+    return os.path.join(app.static_folder, 'pdf', 'styles.css')
+
+
+def pdf_response(path, cache_key, order_number):
+    """Send a rendered PDF from the cache directory without loading it into memory"""
+    download_name = f"proyecto_{order_number}.pdf"
+    if app.config["PDF_X_ACCEL_PREFIX"]:
+        # El proxy sirve el fichero, con soporte de rangos y peticiones condicionales
+        response = make_response("")
+        response.headers["X-Accel-Redirect"] = app.config["PDF_X_ACCEL_PREFIX"] + os.path.basename(path)
+        response.headers["Content-Type"] = "application/pdf"
+        response.headers["Content-Disposition"] = f'inline; filename="{download_name}"'
+        response.set_etag(cache_key)
         return response
 
-    except Exception as e:
-        logger.error(f"Error generando PDF para proyecto {project_id}: {e}")
-        return jsonify({"success": False, "message": "Ha ocurrido un error al procesar su solicitud"}), 500
-    
+    return send_file(path, mimetype="application/pdf", download_name=download_name,
+                     conditional=True, etag=cache_key)
+
+
+def pdf_executor():
+    """Return the process pool shared by downloads, batch exports and pre-renders"""
+    return get_executor(app.config["PDF_BATCH_PROCESSES"], app.config["PDF_WORKER_MAX_RENDERS"],
+                        pdf_css_path(), app.config["PDF_PRERENDER_MAX_CONCURRENT"])
+
+
+def load_pdf_prerender(project_id, user_id):
+    """Load a project for a background render outside of any request"""
+    with app.app_context():
+        loaded = fetch_project(project_id, user_id)
+        if loaded is None:
+            return None
+        cache_key, project_data = prepare_pdf_project(*loaded)
+
+    def render_html():
+        # url_for() de pdf/base.html necesita una petición, no basta el contexto de la aplicación
+        with app.test_request_context():
+            return render_pdf_content(project_data)
+
+    return cache_key, render_html
+
+
+pdf_prerenderer = None
+if app.config["PDF_PRERENDER"]:
+    pdf_prerenderer = PdfPrerenderer(pdf_cache, load_pdf_prerender, pdf_css_path(), pdf_executor(),
+                                     app.config["PDF_PRERENDER_MAX_CONCURRENT"], app.config["PDF_PRERENDER_DELAY"])
+
+
+def pdf_cache_key(project_row, modification_types, applicable_norms, legalization_process,
+                  template_dir, css_path):
+    """Hash everything the rendered PDF depends on"""
+    payload = json.dumps({
+        "project": project_row,
+        "modification_types": modification_types,
+        "applicable_norms": applicable_norms,
+        "legalization_process": legalization_process,
+        "template": directory_digest(template_dir),
+        "css": file_digest(css_path),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 
 @app.route("/logout")
 def logout():
     """Log user out"""
     session.clear()
-    return redirect("/")
\ No newline at end of file
+    return redirect("/")
+
+
+@app.cli.command("import-projects")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--user-id", type=int, required=True, help="Usuario al que se asignan los proyectos")
+@click.option("--format", "file_format", type=click.Choice(FORMATS), help="Por defecto, según la extensión")
+@click.option("--chunk-size", type=int, default=None, help="Filas por transacción")
+@click.option("--errors", "errors_path", type=click.Path(dir_okay=False),
+              help="Guardar todos los errores en este fichero NDJSON")
+def import_projects_command(path, user_id, file_format, chunk_size, errors_path):
+    """Import projects from a CSV or NDJSON file"""
+    file_format = file_format or detect_format(path)
+    if file_format is None:
+        raise click.UsageError("No se reconoce el formato: use --format csv|ndjson")
+    if len(db.execute("SELECT 1 FROM users WHERE id = ?", user_id)) == 0:
+        raise click.UsageError(f"No existe el usuario {user_id}")
+
+    errors_file = open(errors_path, "w", encoding="utf-8") if errors_path else None
+    shown = 0
+
+    def on_error(row, row_errors):
+        nonlocal shown
+        if errors_file:
+            errors_file.write(json.dumps({"row": row, "errors": row_errors}, ensure_ascii=False) + "\n")
+        elif shown < 20:
+            click.echo(f"Fila {row}: " + "; ".join(f"{column}: {message}" for column, message in row_errors.items()))
+            shown += 1
+
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as stream:
+            imported, failed = import_projects(db, reference_data.get(), user_id, read_records(stream, file_format),
+                                               on_error, chunk_size or app.config["IMPORT_CHUNK_SIZE"])
+    finally:
+        if errors_file:
+            errors_file.close()
+    click.echo(f"{imported} proyectos importados, {failed} filas con errores en {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,105 @@
+"""ASGI entry point
+
+Run with an ASGI server, e.g.:
+    uvicorn asgi:application --host 0.0.0.0 --port 8000
+
+The server's event loop holds the connections: idle keep-alive sockets,
+slow uploads and requests waiting for a thread cost no thread. Each
+request then runs the Flask app in a pool of ASGI_REQUEST_THREADS threads.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from app import app
+
+
+# Partes de WsgiToAsgiInstance en las que se apoya _PooledInstance; si una versión
+# nueva de asgiref las cambia, mejor fallar al arrancar que servir respuestas rotas
+for _name in ("build_environ", "start_response", "run_wsgi_app"):
+    if not callable(getattr(WsgiToAsgiInstance, _name, None)):
+        raise ImportError(f"asgiref.wsgi.WsgiToAsgiInstance has no {_name}(); check the pinned asgiref version")
+
+
+class _PooledInstance(WsgiToAsgiInstance):
+    """WsgiToAsgiInstance that runs the app in a given executor
+
+    asgiref runs every WSGI call in one shared thread by default
+    (thread_sensitive=True), which would serve a single request at a time.
+    The WSGI call is reimplemented here on top of build_environ() and
+    start_response(), so nothing depends on how asgiref wraps its own
+    run_wsgi_app.
+    """
+
+    executor = None
+
+    async def run_wsgi_app(self, body):
+        run = sync_to_async(self._run_wsgi_app, thread_sensitive=False, executor=self.executor)
+        return await run(body)
+
+    def _run_wsgi_app(self, body):
+        try:
+            environ = self.build_environ(self.scope, body)
+        except ValueError:
+            # Demasiadas cabeceras duplicadas
+            self.sync_send({"type": "http.response.start", "status": 400,
+                            "headers": [(b"content-type", b"text/plain")]})
+            self.sync_send({"type": "http.response.body", "body": b"Bad Request"})
+            return
+
+        output = self.wsgi_application(environ, self.start_response)
+        try:
+            sent = 0
+            for chunk in output:
+                if not self.response_started:
+                    self.response_started = True
+                    self.sync_send(self.response_start)
+                # No enviar más bytes de los anunciados en Content-Length
+                if self.response_content_length is not None:
+                    chunk = chunk[:self.response_content_length - sent]
+                self.sync_send({"type": "http.response.body", "body": chunk, "more_body": True})
+                sent += len(chunk)
+                if sent == self.response_content_length:
+                    break
+        finally:
+            # PEP 3333: close() libera lo que retenga la respuesta (p. ej. stream_with_context)
+            if hasattr(output, "close"):
+                output.close()
+
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({"type": "http.response.body"})
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """Serve a WSGI app over ASGI with requests spread over a bounded thread pool"""
+
+    def __init__(self, wsgi_application, threads):
+        super().__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="asgi-request")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        instance = _PooledInstance(self.wsgi_application, self.duplicate_header_limit)
+        instance.executor = self.executor
+        await instance(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+app.config["ASGI_REQUEST_THREADS"] = int(os.environ.get("ASGI_REQUEST_THREADS", 32))
+application = PooledWsgiToAsgi(app, app.config["ASGI_REQUEST_THREADS"])
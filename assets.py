@@ -0,0 +1,135 @@
+import hashlib
+import os
+import re
+import threading
+
+from werkzeug.security import safe_join
+
+from compression import precompress
+
+# nombre.<hash>.ext
+FINGERPRINT_RE = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[^./]+)?$")
+
+# url('/static/...') dentro de las hojas de estilo
+CSS_URL_RE = re.compile(r"""url\((['"]?)/static/([^'")?#]+)\1\)""")
+
+# Ficheros de texto que se guardan también comprimidos (gzip y brotli)
+PRECOMPRESSED_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt", ".html")
+
+
+class AssetManifest:
+    """Content-hashed URLs for the files under static/
+
+    ``url("styles.css")`` returns ``/assets/styles.<hash>.css``. The hash
+    covers the file contents, so a fingerprinted URL never changes meaning
+    and can be cached for a year. Stylesheets have their ``/static/`` urls
+    rewritten to fingerprinted ones before hashing. Text files are
+    compressed once with gzip and brotli so they cost no CPU per request.
+    Entries are recomputed when a file changes on disk.
+    """
+
+    def __init__(self, static_folder, prefix="/assets/"):
+        self.static_folder = static_folder
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def build(self):
+        """Fingerprint every file under the static folder"""
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                path = os.path.relpath(os.path.join(root, name), self.static_folder)
+                self._entry(path.replace(os.sep, "/"))
+
+    def url(self, filename):
+        """Return the fingerprinted URL of a static file"""
+        entry = self._entry(filename)
+        if entry is None:
+            return "/static/" + filename
+        return self.prefix + fingerprint(filename, entry["hash"])
+
+    def resolve(self, fingerprinted):
+        """Return (filename, data, variants) for a fingerprinted name, or None if it isn't current
+
+        ``data`` holds the rewritten contents for stylesheets and is None for
+        files that can be sent straight from disk. ``variants`` maps
+        "gzip"/"br" to precompressed contents.
+        """
+        match = FINGERPRINT_RE.match(fingerprinted)
+        if match is None:
+            return None
+        filename = match.group("stem") + (match.group("ext") or "")
+        entry = self._entry(filename)
+        if entry is None or entry["hash"] != match.group("hash"):
+            return None
+        return filename, entry["data"], entry["variants"]
+
+    def _entry(self, filename):
+        path = safe_join(self.static_folder, filename)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(filename)
+        if entry is not None and entry["stamp"] == stamp and self._dependencies_current(entry):
+            return entry
+
+        if filename.endswith(".css"):
+            entry = self._css_entry(path, stamp)
+        else:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(65536), b""):
+                    digest.update(chunk)
+            entry = {"stamp": stamp, "hash": digest.hexdigest()[:12], "data": None, "deps": {}}
+
+        entry["variants"] = {}
+        if filename.endswith(PRECOMPRESSED_EXTENSIONS):
+            if entry["data"] is None:
+                with open(path, "rb") as f:
+                    entry["variants"] = precompress(f.read())
+            else:
+                entry["variants"] = precompress(entry["data"])
+
+        with self._lock:
+            self._entries[filename] = entry
+        return entry
+
+    def _css_entry(self, path, stamp):
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+
+        deps = {}
+
+        def replace(match):
+            dependency = match.group(2)
+            entry = self._entry(dependency)
+            if entry is None:
+                return match.group(0)
+            deps[dependency] = entry["hash"]
+            quote = match.group(1)
+            return f"url({quote}{self.prefix}{fingerprint(dependency, entry['hash'])}{quote})"
+
+        data = CSS_URL_RE.sub(replace, source).encode("utf-8")
+        return {"stamp": stamp, "hash": hashlib.sha256(data).hexdigest()[:12], "data": data, "deps": deps}
+
+    def _dependencies_current(self, entry):
+        for dependency, digest in entry["deps"].items():
+            current = self._entry(dependency)
+            if current is None or current["hash"] != digest:
+                return False
+        return True
+
+
+def fingerprint(filename, digest):
+    """Insert a content hash before the file extension"""
+    head, sep, tail = filename.rpartition("/")
+    stem, dot, ext = tail.rpartition(".")
+    if not dot or not stem:
+        return f"{filename}.{digest}"
+    return f"{head}{sep}{stem}.{digest}.{ext}"
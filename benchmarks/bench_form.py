@@ -0,0 +1,127 @@
+"""Benchmark parsing and validation of the project form
+
+Times what add_project does with a submitted form before touching the
+database: reading every field, validating it and building the INSERT
+arguments. The compiled ``project_form`` is compared with the previous
+hand-written code, reproduced below as ``legacy_parse``.
+
+Usage:
+    python benchmarks/bench_form.py
+    python benchmarks/bench_form.py --iterations 20000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from werkzeug.datastructures import MultiDict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from project_form import project_form  # noqa: E402
+from reference_data import ReferenceData  # noqa: E402
+
+REQUIRED = ["orderNumber", "rae", "clientName", "clientNIF", "clientAddress", "clientCity", "clientZip",
+            "liftAddress", "liftCity", "liftZip"]
+
+
+def sample_forms():
+    """Return (name, MultiDict) pairs: a valid full form, a minimal one and an invalid one"""
+    full = MultiDict({field.name: f" valor {field.name} " for field in project_form.fields})
+    full.update({"clientZip": "41001", "liftZip": "41002"})
+    full.setlist("modification_types", ["1", "5", "8", "10", "12"])
+    full.setlist("applicable_norms", ["1", "3"])
+    full["legalization_process"] = "1"
+
+    minimal = MultiDict({name: "x" for name in REQUIRED})
+    minimal.update({"clientZip": "28001", "liftZip": "28002", "modification_types": "1",
+                    "applicable_norms": "1", "legalization_process": "2"})
+
+    invalid = MultiDict({"orderNumber": "1", "clientZip": "123", "liftZip": "abcde"})
+    invalid.setlist("modification_types", ["1", "999"])
+    return [("completo", full), ("mínimo", minimal), ("inválido", invalid)]
+
+
+def legacy_parse(form, reference):
+    """The validation of add_project before project_form, minus the database
+
+    One ``form.get`` and one ``if`` block per field, as the route had them.
+    """
+    values = {}
+    for name in REQUIRED:
+        values[name] = (form.get(name) or "").strip()
+    for field in project_form.fields[len(REQUIRED):]:
+        values[field.name] = form.get(field.name.strip() or "")
+    mod_types = form.getlist("modification_types")
+    norms = form.getlist("applicable_norms")
+    process = form.get("legalization_process")
+
+    errors = {}
+    for name in REQUIRED:
+        if not values[name]:
+            errors[name] = "Campo requerido"
+    for name in ("clientZip", "liftZip"):
+        value = values[name]
+        if value and not (value.isdigit() and len(value) == 5):
+            errors[name] = "El código postal debe tener 5 dígitos"
+
+    def valid_codes(table, codes):
+        return len(set(codes)) == len(codes) and table.codes.issuperset(codes)
+
+    if not mod_types:
+        errors["ModificationTypesInput"] = "Campo requerido"
+    elif not valid_codes(reference.modification_types, mod_types):
+        errors["ModificationTypesInput"] = "Tipo de modificación inválido"
+    if not norms:
+        errors["AplicableNormsInput"] = "Campo requerido"
+    elif not valid_codes(reference.applicable_norms, norms):
+        errors["AplicableNormsInput"] = "Normativa aplicable inválida"
+    if not process:
+        errors["LegalizationProcessInput"] = "Campo requerido"
+    elif process not in reference.legalization_process.codes:
+        errors["LegalizationProcessInput"] = "Proceso de legalización inválido"
+
+    params = (1, *[values[field.name] for field in project_form.fields])
+    return params, errors
+
+
+def compiled_parse(form, reference):
+    """The same work through project_form"""
+    values, links, errors = project_form.parse(form, reference)
+    return project_form.insert_params(1, values), errors
+
+
+def measure(function, form, reference, iterations):
+    """Return the per-call time in microseconds of ``iterations`` calls, in batches of 100"""
+    batch = 100
+    samples = []
+    for _ in range(max(1, iterations // batch)):
+        start = time.perf_counter()
+        for _ in range(batch):
+            function(form, reference)
+        samples.append((time.perf_counter() - start) / batch * 1e6)
+    samples.sort()
+    return {"p50": statistics.median(samples), "p90": samples[int(len(samples) * 0.9)]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.path.join(ROOT, "project.db"),
+                        help="base de datos de la que se leen las tablas de referencia")
+    parser.add_argument("--iterations", type=int, default=10000)
+    args = parser.parse_args()
+
+    reference = ReferenceData(args.db).get()
+
+    print(f"  {'formulario':<12}{'versión':<12}{'p50 µs':>10}{'p90 µs':>10}")
+    for name, form in sample_forms():
+        for label, function in (("anterior", legacy_parse), ("compilado", compiled_parse)):
+            stats = measure(function, form, reference, args.iterations)
+            print(f"  {name:<12}{label:<12}{stats['p50']:>10.2f}{stats['p90']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Benchmark password verification throughput
+
+Verifies a password repeatedly through PasswordHasher, first with one
+worker and then with one worker per core, and reports logins per second
+and per core for each hash method. While the pool is busy a small pure
+Python loop runs in the main thread, to show how much hashing slows the
+rest of the process.
+
+Usage:
+    python benchmarks/bench_login.py
+    python benchmarks/bench_login.py --methods scrypt pbkdf2:sha256:600000 --logins 200
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from password_hashing import PasswordHasher  # noqa: E402
+
+PASSWORD = "Contraseña-de-prueba-1"
+
+
+def busy_loop_ms():
+    """Time of a fixed pure Python workload, in milliseconds"""
+    start = time.perf_counter()
+    total = 0
+    for i in range(200000):
+        total += i % 7
+    return (time.perf_counter() - start) * 1000
+
+
+def run(method, workers, logins):
+    """Return (logins per second, busy loop ms while hashing) for ``logins`` verifications"""
+    hasher = PasswordHasher(method, workers, max_queue=logins, timeout=600)
+    pwhash = hasher.hash(PASSWORD)
+
+    with ThreadPoolExecutor(max_workers=logins) as clients:
+        start = time.perf_counter()
+        futures = [clients.submit(hasher.verify, pwhash, PASSWORD) for _ in range(logins)]
+        loop_ms = busy_loop_ms()
+        assert all(future.result() for future in futures)
+        elapsed = time.perf_counter() - start
+    return logins / elapsed, loop_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--methods", nargs="+", default=["scrypt", "pbkdf2:sha256:600000"])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    idle_ms = min(busy_loop_ms() for _ in range(5))
+    print(f"Bucle de referencia sin carga: {idle_ms:.1f} ms ({args.workers} núcleos)")
+    print(f"  {'método':<24}{'hilos':>6}{'logins/s':>12}{'por núcleo':>12}{'bucle ms':>10}")
+    for method in args.methods:
+        for workers in sorted({1, args.workers}):
+            rate, loop_ms = run(method, workers, args.logins)
+            print(f"  {method:<24}{workers:>6}{rate:>12.1f}{rate / workers:>12.1f}{loop_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
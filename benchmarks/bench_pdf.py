@@ -0,0 +1,343 @@
+"""Benchmark PDF generation phase by phase
+
+Seeds a throwaway copy of the database with synthetic projects and times
+each step of generate_pdf separately: DB fetch, escaping of the text
+fields, Jinja render, WeasyPrint layout (in total and per section) and
+PDF write, the way generate_pdf does them: section by section unless
+PDF_SECTION_CACHE=0. The end-to-end PDF render is also timed twice, with
+an empty section cache (pdf_miss) and with every section layout cached
+(pdf_hit).
+
+Usage:
+    python benchmarks/bench_pdf.py
+    python benchmarks/bench_pdf.py --save-baseline benchmarks/baseline_pdf.json
+    python benchmarks/bench_pdf.py --compare benchmarks/baseline_pdf.json
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = ["db_fetch", "escape", "jinja", "layout", "write", "pdf_miss", "pdf_hit"]
+
+# (nº de tipos de modificación, nº de normativas) de cada escenario
+SCENARIOS = {
+    "minimal": (1, 1),
+    "typical": (5, 2),
+    "full": (None, None),
+}
+
+WORDS = ["calle", "avenida", "plaza", "mayor", "real", "san", "josé", "maría", "industrial",
+         "comunidad", "propietarios", "edificio", "portal", "escalera", "bajo", "ascensores"]
+
+
+def text(rng, length):
+    """Return a random Spanish-looking string of about ``length`` characters"""
+    words = []
+    while sum(len(word) + 1 for word in words) < length:
+        words.append(rng.choice(WORDS))
+    return " ".join(words).capitalize()[:length]
+
+
+def synthetic_project(rng, index):
+    """Return form-like column values with realistic lengths"""
+    return {
+        "order_number": f"10{index:08d}",
+        "rae": f"RAE-{rng.randint(10000, 99999)}",
+        "client_name": text(rng, 40),
+        "client_nif": f"B{rng.randint(10000000, 99999999)}",
+        "client_address": text(rng, 60),
+        "client_city": text(rng, 20),
+        "client_zip": f"{rng.randint(1000, 52999):05d}",
+        "lift_address": text(rng, 60),
+        "lift_city": text(rng, 20),
+        "lift_zip": f"{rng.randint(1000, 52999):05d}",
+        "exam_type": text(rng, 25),
+        "oca": text(rng, 30),
+        "qms": text(rng, 30),
+        "nominal_load": str(rng.choice([320, 450, 630, 1000])),
+        "speed": rng.choice(["0,63", "1", "1,6"]),
+        "machine_room": rng.choice(["Arriba", "Abajo", "Lateral", "Sin cuarto"]),
+        "passengers": str(rng.choice([4, 6, 8, 13])),
+        "control_system": rng.choice(["1 velocidad", "2 velocidades", "Variador Frec."]),
+        "cab_dimensions": f"{rng.randint(800, 1400)}x{rng.randint(1000, 2100)}",
+        "stops": str(rng.randint(2, 15)),
+        "nominal_tension": rng.choice(["400", "380", "230"]),
+        "door_type": rng.choice(["LA2", "LA3", "CA2", "CA3"]),
+        "travel": str(rng.randint(3, 45)),
+        "nominal_power": str(rng.randint(3, 15)),
+        "door_size": f"{rng.randint(700, 900)}x2000",
+        "num_cable": str(rng.randint(3, 8)),
+        "nominal_intensity": str(rng.randint(8, 40)),
+        "cable_diameter": rng.choice(["6,0", "6,5", "8", "10"]),
+        "ratio": rng.choice(["1:1", "2:1"]),
+        "cab_mass": str(rng.randint(300, 900)),
+        "cab_rails": rng.choice(["R-3", "R-5", "R-7"]),
+        "cw_mass": str(rng.randint(400, 1200)),
+        "cw_rails": rng.choice(["R-3", "R-5", "R-7"]),
+        "locking_device1": "TIPO 11/R-L",
+        "locking_device2": "TIPO 41/C",
+        "machine_brake": "FZD12A",
+        "cab_parachute": "ASG-100",
+        "cw_parachute": "ASG-65",
+        "cab_speed_governor": "SGN-200",
+        "cw_speed_governor": "VEGA",
+        "cab_buffer": "300401",
+        "cw_buffer": "300402",
+        "safety_circuit": "RS-200",
+        "ucm_detect": "MIC-20.50-DETECT.",
+        "ucm_act": "MIC-20.50-ACT.",
+        "ucm_stop": text(rng, 20),
+    }
+
+
+def seed_database(source, target, projects_per_scenario, seed):
+    """Copy the schema and reference tables of ``source`` and add synthetic projects
+
+    Returns a list of ``(scenario, project_id)`` pairs.
+    """
+    rng = random.Random(seed)
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+
+    # Las tablas internas de FTS5 las crea su tabla virtual
+    for name, sql in src.execute(
+            """SELECT name, sql FROM sqlite_master AS m
+            WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+            AND NOT EXISTS (SELECT 1 FROM sqlite_master AS v
+                            WHERE v.sql LIKE 'CREATE VIRTUAL TABLE%'
+                            AND m.type = 'table' AND m.name LIKE v.name || '\\_%' ESCAPE '\\')"""):
+        dst.execute(sql)
+    for table in ("modification_types", "applicable_norms", "legalization_process"):
+        rows = src.execute(f"SELECT id, code, label FROM {table}").fetchall()
+        dst.executemany(f"INSERT INTO {table} (id, code, label) VALUES (?, ?, ?)", rows)
+    src.close()
+
+    dst.execute("INSERT INTO users (id, name, email, password_hash) VALUES (1, 'bench', 'bench@example.com', '')")
+    mod_ids = [row[0] for row in dst.execute("SELECT id FROM modification_types")]
+    norm_ids = [row[0] for row in dst.execute("SELECT id FROM applicable_norms")]
+    process_ids = [row[0] for row in dst.execute("SELECT id FROM legalization_process")]
+
+    projects = []
+    index = 0
+    for scenario, (mods, norms) in SCENARIOS.items():
+        for _ in range(projects_per_scenario):
+            values = synthetic_project(rng, index)
+            index += 1
+            columns = ", ".join(values)
+            placeholders = ", ".join("?" * len(values))
+            project_id = dst.execute(
+                f"""INSERT INTO projects_test (user_id, {columns}, updated_at)
+                VALUES (1, {placeholders}, CURRENT_TIMESTAMP)""",
+                list(values.values())
+            ).lastrowid
+
+            chosen_mods = mod_ids if mods is None else rng.sample(mod_ids, min(mods, len(mod_ids)))
+            chosen_norms = norm_ids if norms is None else rng.sample(norm_ids, min(norms, len(norm_ids)))
+            dst.executemany("INSERT INTO project_modification_types VALUES (?, ?)",
+                            [(project_id, mod_id) for mod_id in chosen_mods])
+            dst.executemany("INSERT INTO project_applicable_norms VALUES (?, ?)",
+                            [(project_id, norm_id) for norm_id in chosen_norms])
+            dst.execute("INSERT INTO project_legalization_process VALUES (?, ?)",
+                        (project_id, rng.choice(process_ids)))
+            projects.append((scenario, project_id))
+
+    dst.commit()
+    dst.close()
+    return projects
+
+
+def percentiles(samples):
+    """Return p50/p90/p99 and max in milliseconds"""
+    ordered = sorted(samples)
+    if len(ordered) > 1:
+        cuts = statistics.quantiles(ordered, n=100, method="inclusive")
+        p50, p90, p99 = cuts[49], cuts[89], cuts[98]
+    else:
+        p50 = p90 = p99 = ordered[0]
+    return {"p50": p50 * 1000, "p90": p90 * 1000, "p99": p99 * 1000, "max": ordered[-1] * 1000}
+
+
+def time_layout_and_write(renderer, html_content, section_names):
+    """Lay out and write a PDF as a section cache miss does, timing each step
+
+    Returns ``(layout seconds per section name, write seconds, PDF bytes)``.
+    A whole document counts as one section named "documento".
+    """
+    if not isinstance(html_content, list):
+        html_content, section_names = [html_content], ["documento"]
+
+    layouts = {}
+    documents = []
+    for name, section in zip(section_names, html_content):
+        start = time.perf_counter()
+        documents.append(renderer.layout(section))
+        layouts[name] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pages = [page for document in documents for page in document.pages]
+    pdf = documents[0].copy(pages).write_pdf()
+    return layouts, time.perf_counter() - start, pdf
+
+
+def run(app_module, renderer, projects, iterations):
+    """Time every phase for every project and return the results per scenario
+
+    pdf_hit is only timed when the PDF is rendered by sections.
+    """
+    from pdf_render import render_pdf
+
+    app = app_module.app
+    css_path = app_module.pdf_css_path()
+    section_names = [os.path.splitext(os.path.basename(path))[0] for path in app_module.PDF_SECTIONS]
+    renderer.warm()
+
+    timings = {}
+    for scenario, _ in projects:
+        timings.setdefault(scenario, {"phases": {phase: [] for phase in PHASES},
+                                      "total": [], "sizes": [], "peak_kb": 0})
+
+    tracemalloc.start()
+    with app.test_request_context():
+        for _ in range(iterations):
+            for scenario, project_id in projects:
+                result = timings[scenario]
+                tracemalloc.reset_peak()
+
+                start = time.perf_counter()
+                rows = app_module.fetch_project(project_id, 1)
+                fetched = time.perf_counter()
+
+                _, project_data = app_module.prepare_pdf_project(*rows)
+                raw = dict(rows[0])
+                escape_start = time.perf_counter()
+                app_module.escape_pdf_fields(raw)
+                escaped = time.perf_counter()
+
+                html_content = app_module.render_pdf_content(project_data)
+                rendered = time.perf_counter()
+
+                layouts, write, pdf = time_layout_and_write(renderer, html_content, section_names)
+
+                renderer.clear_sections()
+                miss_start = time.perf_counter()
+                render_pdf(html_content, css_path)
+                miss = time.perf_counter() - miss_start
+
+                phases = result["phases"]
+                phases["db_fetch"].append(fetched - start)
+                phases["escape"].append(escaped - escape_start)
+                phases["jinja"].append(rendered - escaped)
+                phases["layout"].append(sum(layouts.values()))
+                for name, seconds in layouts.items():
+                    phases.setdefault(f"layout:{name}", []).append(seconds)
+                phases["write"].append(write)
+                phases["pdf_miss"].append(miss)
+                result["total"].append((fetched - start) + (rendered - escape_start) + miss)
+
+                if isinstance(html_content, list):
+                    hit_start = time.perf_counter()
+                    render_pdf(html_content, css_path)
+                    phases["pdf_hit"].append(time.perf_counter() - hit_start)
+                result["sizes"].append(len(pdf))
+                result["peak_kb"] = max(result["peak_kb"], tracemalloc.get_traced_memory()[1] / 1024)
+    tracemalloc.stop()
+
+    report = {}
+    for scenario, result in timings.items():
+        report[scenario] = {
+            "phases": {phase: percentiles(samples) for phase, samples in result["phases"].items() if samples},
+            "total": percentiles(result["total"]),
+            "pdf_bytes": statistics.mean(result["sizes"]),
+            "python_peak_kb": result["peak_kb"],
+        }
+    return {
+        "scenarios": report,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "iterations": iterations,
+    }
+
+
+def print_report(report):
+    for scenario, result in report["scenarios"].items():
+        print(f"\n{scenario}  (PDF {result['pdf_bytes'] / 1024:.1f} KB, "
+              f"pico Python {result['python_peak_kb']:.0f} KB)")
+        print(f"  {'fase':<22}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for phase, stats in list(result["phases"].items()) + [("total", result["total"])]:
+            print(f"  {phase:<22}{stats['p50']:>10.2f}{stats['p90']:>10.2f}{stats['p99']:>10.2f}{stats['max']:>10.2f}")
+    print(f"\nRSS máximo del proceso: {report['max_rss_kb'] / 1024:.1f} MB")
+
+
+def compare(report, baseline, threshold):
+    """Return the p50 timings that got slower than the baseline by more than threshold"""
+    regressions = []
+    for scenario, result in report["scenarios"].items():
+        base = baseline["scenarios"].get(scenario)
+        if base is None:
+            continue
+        checks = list(result["phases"].items()) + [("total", result["total"])]
+        for phase, stats in checks:
+            before = base["total"] if phase == "total" else base["phases"].get(phase)
+            if before and before["p50"] > 0 and stats["p50"] > before["p50"] * (1 + threshold):
+                regressions.append((scenario, phase, before["p50"], stats["p50"]))
+        if result["pdf_bytes"] > base["pdf_bytes"] * (1 + threshold):
+            regressions.append((scenario, "pdf_bytes", base["pdf_bytes"], result["pdf_bytes"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.path.join(ROOT, "project.db"),
+                        help="database whose schema and reference tables are copied")
+    parser.add_argument("--projects", type=int, default=5, help="projects per scenario")
+    parser.add_argument("--iterations", type=int, default=3, help="renders per project")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", metavar="FILE", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="flag regressions against a baseline")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="allowed slowdown before a phase counts as a regression (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="doculift-bench-")
+    projects = seed_database(args.db, os.path.join(workdir, "project.db"), args.projects, args.seed)
+
+    # app.py abre project.db relativo al directorio de trabajo
+    os.chdir(workdir)
+    os.environ.setdefault("PDF_CACHE_DIR", os.path.join(workdir, "pdf_cache"))
+    os.environ.setdefault("PDF_WARM_RENDERER", "0")
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    from pdf_render import get_renderer
+
+    report = run(app_module, get_renderer(app_module.pdf_css_path()), projects, args.iterations)
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nLínea base guardada en {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print("\nRegresiones:")
+            for scenario, phase, before, after in regressions:
+                print(f"  {scenario}/{phase}: {before:.2f} -> {after:.2f}")
+            sys.exit(1)
+        print("\nSin regresiones respecto a la línea base")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/x-ndjson",
+    "image/svg+xml",
+    "text/css",
+    "text/csv",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+}
+
+
+def choose_encoding(accept_encodings):
+    """Return the best encoding the client accepts: "br", "gzip" or None"""
+    if brotli is not None and accept_encodings.quality("br") > 0:
+        return "br"
+    if accept_encodings.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding, level=None):
+    """Compress bytes with gzip or brotli
+
+    ``level`` defaults to a fast setting suitable for per-request use.
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=5 if level is None else level)
+    return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
+
+
+def precompress(data):
+    """Return the gzip and brotli variants of data at maximum compression"""
+    variants = {"gzip": compress(data, "gzip", 9)}
+    if brotli is not None:
+        variants["br"] = compress(data, "br", 11)
+    return variants
+
+
+def compress_response(response, accept_encodings, min_size):
+    """Compress a buffered text response in place if the client accepts it"""
+    if (response.status_code < 200 or response.status_code >= 300 or response.status_code == 204
+            or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+
+    # Cada codificación es una representación distinta del recurso
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
@@ -0,0 +1,144 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+
+class Database:
+    """Pool of SQLite connections with the ``execute`` interface of cs50.SQL
+
+    ``execute`` returns a list of dict rows for queries that return rows,
+    the new row id for INSERT and the number of affected rows otherwise.
+    Each call borrows a connection from the pool and returns it right away,
+    so concurrent readers never wait on each other. Connections run in WAL
+    mode, which lets readers proceed while a write is in progress, and
+    keep their compiled statements in sqlite3's statement cache.
+
+    Inside ``with db.transaction():`` every call made by the same thread
+    goes through one connection and is committed or rolled back together.
+    """
+
+    def __init__(self, path, max_connections=8, busy_timeout=5000, cache_size_kib=16384,
+                 mmap_size=256 * 1024 * 1024, cached_statements=256, checkout_timeout=30):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.checkout_timeout = checkout_timeout
+        self._pool = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._local = threading.local()
+
+        # journal_mode se guarda en el fichero: basta con fijarlo una vez
+        connection = self._connect()
+        connection.execute("PRAGMA journal_mode = WAL")
+        self._pool.put(connection)
+
+    def _connect(self, read_only=False):
+        path, uri = self.path, False
+        if read_only:
+            path, uri = f"file:{quote(os.path.abspath(self.path))}?mode=ro", True
+        connection = sqlite3.connect(path, timeout=self.busy_timeout / 1000, isolation_level=None,
+                                     check_same_thread=False, cached_statements=self.cached_statements, uri=uri)
+        connection.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        connection.execute("PRAGMA temp_store = MEMORY")
+        connection.execute("PRAGMA foreign_keys = ON")
+        return connection
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise RuntimeError("No hay conexiones libres a la base de datos")
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, connection):
+        if connection.in_transaction:
+            connection.rollback()
+        self._pool.put(connection)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, or reuse the one of the current transaction"""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            yield connection
+            return
+        connection = self._acquire()
+        try:
+            yield connection
+        finally:
+            self._release(connection)
+
+    def execute(self, sql, *args):
+        """Run one statement and return rows, the new row id or the row count"""
+        with self.connection() as connection:
+            cursor = connection.execute(sql, args)
+            try:
+                if cursor.description is not None:
+                    columns = [column[0] for column in cursor.description]
+                    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+                if sql.lstrip().split(None, 1)[0].upper() in ("INSERT", "REPLACE"):
+                    return cursor.lastrowid
+                return cursor.rowcount
+            finally:
+                cursor.close()
+
+    def iterate(self, sql, *args, batch_size=500):
+        """Yield the rows of a query as tuples, fetching ``batch_size`` at a time
+
+        The query runs on its own read-only connection, opened outside the
+        pool and closed when the generator is exhausted or closed, so a slow
+        download never holds a connection other requests are waiting for.
+        It reads one consistent snapshot throughout.
+        """
+        connection = self._connect(read_only=True)
+        try:
+            cursor = connection.execute(sql, args)
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield from rows
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed calls of this thread in one write transaction
+
+        Nested blocks join the outermost transaction.
+        """
+        if getattr(self._local, "connection", None) is not None:
+            yield self
+            return
+
+        connection = self._acquire()
+        self._local.connection = connection
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self
+            except BaseException:
+                connection.rollback()
+                raise
+            connection.commit()
+        finally:
+            self._local.connection = None
+            self._release(connection)
@@ -0,0 +1,49 @@
+import sqlite3
+import threading
+
+
+class EmailIndex:
+    """In-memory set of the registered email addresses
+
+    ``contains()`` answers whether an email is taken without querying the
+    users table. The set is loaded when the index is created, ``add()``
+    records the accounts created by this process, and ``PRAGMA
+    data_version`` on a private connection tells when another process has
+    committed: then only the users with an id above the highest one seen
+    are read.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._emails = set()
+        self._last_id = 0
+        self._data_version = None
+        with self._lock:
+            self._refresh()
+
+    def contains(self, email):
+        """Return True if an account already uses this (normalized) email"""
+        with self._lock:
+            self._refresh()
+            return email in self._emails
+
+    def add(self, email):
+        """Record an email registered by this process"""
+        with self._lock:
+            self._emails.add(email)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._emails)
+
+    def _refresh(self):
+        data_version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        # Los usuarios no se borran: basta con leer los nuevos
+        cursor = self._connection.execute("SELECT id, email FROM users WHERE id > ? ORDER BY id", (self._last_id,))
+        for user_id, email in cursor:
+            self._emails.add(email)
+            self._last_id = user_id
+        self._data_version = data_version
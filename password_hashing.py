@@ -0,0 +1,57 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash waited too long"""
+
+
+class PasswordHasher:
+    """Hash and verify passwords in a bounded pool of threads
+
+    scrypt and PBKDF2 run inside hashlib without the GIL, so at most
+    ``workers`` hashes use the CPU at once while the other request threads
+    keep running. Up to ``max_queue`` more wait for a free worker; past
+    that ``hash`` and ``verify`` raise HasherBusy straight away, so a login
+    burst is answered with 503 instead of piling up.
+
+    ``method`` is passed to werkzeug's generate_password_hash (e.g.
+    "scrypt" or "pbkdf2:sha256:600000"); ``needs_rehash`` tells whether a
+    stored hash was made with other parameters.
+    """
+
+    def __init__(self, method, workers, max_queue, timeout):
+        self.method = method
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        # Prefijo que werkzeug escribe para este método, con los parámetros por defecto ya resueltos
+        self.method_id = generate_password_hash("", method).split("$", 1)[0]
+
+    def hash(self, password):
+        """Return a new hash of ``password``"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """Return True if ``password`` matches ``pwhash``"""
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Return True if ``pwhash`` wasn't made with the current method and cost"""
+        return pwhash.split("$", 1)[0] != self.method_id
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._executor.submit(function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy() from None
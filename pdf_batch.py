@@ -0,0 +1,84 @@
+import logging
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from pdf_render import render_pdf
+
+logger = logging.getLogger(__name__)
+
+
+class ZipBuffer:
+    """Write-only, unseekable file object that collects ZIP output chunks
+
+    Because it can't seek, zipfile writes each entry with a trailing data
+    descriptor and the archive can be sent while it is being built.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Return and forget everything written so far"""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_pdf_zip(entries, cache, css_path, executor, window):
+    """Yield a ZIP archive with one PDF per entry, rendering misses in parallel
+
+    ``entries`` yields ``(filename, cache_key, render_html)`` tuples; an
+    entry with no cache key is listed in errores.txt. At most ``window``
+    renders are in flight at once, so memory doesn't grow with the number
+    of projects.
+    """
+    buffer = ZipBuffer()
+    failed = []
+    pending = {}
+
+    def collect(done):
+        for future in done:
+            filename, cache_key = pending.pop(future)
+            try:
+                pdf = future.result()
+                cache.put(cache_key, pdf)
+            except Exception as e:
+                logger.error(f"Error generando {filename}: {e}")
+                failed.append(filename)
+                continue
+            archive.writestr(filename, pdf)
+
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for filename, cache_key, render_html in entries:
+            if cache_key is None:
+                failed.append(filename)
+                continue
+
+            pdf = cache.get(cache_key)
+            if pdf is not None:
+                archive.writestr(filename, pdf)
+                yield buffer.drain()
+                continue
+
+            pending[executor.submit(render_pdf, render_html(), css_path)] = (filename, cache_key)
+            if len(pending) >= window:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+                yield buffer.drain()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+            yield buffer.drain()
+
+        if failed:
+            archive.writestr("errores.txt", "No se han podido generar:\n" + "\n".join(failed) + "\n")
+
+    yield buffer.drain()
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class PdfCache:
+    """Disk-backed, content-addressed cache for rendered PDFs
+
+    Entries are stored as ``<key>.pdf`` files inside ``directory``. When the
+    total size goes over ``max_bytes`` the least recently used files are
+    removed. Concurrent requests for the same key share a single render.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = OrderedDict()
+        self._size = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU index from the files already on disk"""
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pdf"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, name[:-4], stat.st_size))
+
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+
+    def path(self, key):
+        """Return the file path used for a key"""
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def contains(self, key):
+        """Return True if a PDF is cached for a key"""
+        return os.path.exists(self.path(key))
+
+    def lookup(self, key):
+        """Return the file path of a cached PDF, or None, marking it as recently used"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(key)
+            return None
+        except OSError:
+            pass
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return path
+
+    def get(self, key):
+        """Return the cached PDF bytes for a key, or None"""
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, key, write):
+        """Store a PDF by calling write(file) on a temporary file in the cache directory
+
+        The file is opened by path, so ``file.name`` lets another process
+        write the PDF straight into it.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            with open(tmp_path, "wb") as f:
+                write(f)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, self.path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = size
+            self._size += size
+            self._evict()
+
+    def put(self, key, data):
+        """Store PDF bytes under a key and evict old entries if needed"""
+        self.write(key, lambda f: f.write(data))
+
+    def path_or_render(self, key, write):
+        """Return the file path for key, calling write(file) once on a miss
+
+        Requests for a key that is already being rendered wait for that
+        render instead of starting their own.
+        """
+        path = self.lookup(key)
+        if path is not None:
+            return path
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+
+        try:
+            with key_lock[0]:
+                path = self.lookup(key)
+                if path is None:
+                    self.write(key, write)
+                    path = self.path(key)
+                return path
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if key_lock[1] == 0:
+                    self._key_locks.pop(key, None)
+
+    def _forget(self, key):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._size -= size
+
+    def _evict(self):
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+
+_file_digests = {}
+
+
+def file_digest(path):
+    """Return the sha256 of a file, recomputed only when it changes on disk"""
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _file_digests.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _file_digests[path] = (stamp, digest)
+    return digest
+
+
+def directory_digest(path):
+    """Return a sha256 covering every file below a directory"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+            digest.update(file_digest(file_path).encode("ascii"))
+    return digest.hexdigest()
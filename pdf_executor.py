@@ -0,0 +1,100 @@
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+
+from pdf_render import warm_renderer
+
+
+class PdfExecutor:
+    """Process pool shared by PDF downloads, batch exports and background pre-renders
+
+    Work passed to submit() goes straight to the pool. Work passed to
+    submit_background() waits in its own queue and only starts when a
+    process is idle and fewer than ``background_slots`` background renders
+    are running, so a pre-render never queues ahead of a download.
+    """
+
+    def __init__(self, processes, max_renders, css_path, background_slots=1):
+        self.processes = processes
+        self.background_slots = background_slots
+        self._pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=max_renders,
+            initializer=warm_renderer,
+            initargs=(css_path,),
+        )
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._background_running = 0
+        self._background = deque()
+
+    def submit(self, fn, *args):
+        """Run fn(*args) in the pool and return its future"""
+        with self._lock:
+            self._busy += 1
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._release(False)
+            raise
+        future.add_done_callback(lambda _: self._release(False))
+        return future
+
+    def submit_background(self, fn, *args):
+        """Queue fn(*args) in the low-priority lane and return its future"""
+        future = Future()
+        with self._lock:
+            self._background.append((future, fn, args))
+        self._dispatch()
+        return future
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                if (not self._background or self._busy >= self.processes
+                        or self._background_running >= self.background_slots):
+                    return
+                future, fn, args = self._background.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._busy += 1
+                self._background_running += 1
+
+            try:
+                inner = self._pool.submit(fn, *args)
+            except Exception as e:
+                future.set_exception(e)
+                self._release(True)
+                continue
+            inner.add_done_callback(partial(self._background_done, future))
+
+    def _background_done(self, future, inner):
+        error = inner.exception()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(inner.result())
+        self._release(True)
+
+    def _release(self, background):
+        with self._lock:
+            self._busy -= 1
+            if background:
+                self._background_running -= 1
+        self._dispatch()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(processes, max_renders, css_path, background_slots=1):
+    """Return the process's shared PDF executor, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = PdfExecutor(processes, max_renders, css_path, background_slots)
+        return _executor
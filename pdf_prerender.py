@@ -0,0 +1,116 @@
+import itertools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from pdf_render import render_pdf
+
+logger = logging.getLogger(__name__)
+
+
+class PdfPrerenderer:
+    """Render a project's PDF in the background right after it is saved
+
+    Saves that arrive within ``delay`` seconds of each other are coalesced
+    into a single render, and a newer save cancels a render of the older
+    one that hasn't started yet. Renders go to the low-priority lane of the
+    shared PdfExecutor, which runs at most ``max_concurrent`` of them and
+    only on idle processes. No cache lock is held while a render waits: a
+    download of the same PDF renders on its own instead of waiting behind
+    it, and the pre-render is stored only if the PDF is still missing.
+
+    ``load`` is called as ``load(project_id, user_id)`` and must return
+    ``(cache_key, render_html)`` or None if the project is gone.
+    """
+
+    def __init__(self, cache, load, css_path, executor, max_concurrent, delay):
+        self.cache = cache
+        self.load = load
+        self.css_path = css_path
+        self.executor = executor
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        self._generations = {}
+        self._timers = {}
+        self._renders = {}
+        self._threads = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="pdf-prerender")
+
+    def schedule(self, project_id, user_id):
+        """Queue a render of a project, superseding any earlier one"""
+        with self._lock:
+            generation = next(self._counter)
+            self._generations[project_id] = generation
+
+            timer = self._timers.pop(project_id, None)
+            if timer is not None:
+                timer.cancel()
+            stale = self._renders.pop(project_id, None)
+
+            timer = threading.Timer(self.delay, self._enqueue, (project_id, user_id, generation))
+            timer.daemon = True
+            self._timers[project_id] = timer
+            timer.start()
+
+        # Fuera del lock: cancel() ejecuta en este hilo los callbacks del futuro
+        if stale is not None:
+            stale.cancel()
+
+    def _enqueue(self, project_id, user_id, generation):
+        with self._lock:
+            if self._timers.get(project_id) is threading.current_thread():
+                del self._timers[project_id]
+        self._threads.submit(self._run, project_id, user_id, generation)
+
+    def _is_current(self, project_id, generation):
+        with self._lock:
+            return self._generations.get(project_id) == generation
+
+    def _forget(self, project_id, generation):
+        with self._lock:
+            if self._generations.get(project_id) == generation:
+                del self._generations[project_id]
+
+    def _run(self, project_id, user_id, generation):
+        if not self._is_current(project_id, generation):
+            return
+        try:
+            loaded = self.load(project_id, user_id)
+            if loaded is None:
+                self._forget(project_id, generation)
+                return
+            cache_key, render_html = loaded
+            if self.cache.contains(cache_key) or not self._is_current(project_id, generation):
+                self._forget(project_id, generation)
+                return
+
+            future = self.executor.submit_background(render_pdf, render_html(), self.css_path)
+            with self._lock:
+                current = self._generations.get(project_id) == generation
+                if current:
+                    self._renders[project_id] = future
+            if not current:
+                future.cancel()
+                return
+            future.add_done_callback(
+                lambda done: self._threads.submit(self._store, project_id, generation, cache_key, done)
+            )
+        except Exception as e:
+            logger.error(f"Error pregenerando PDF para proyecto {project_id}: {e}")
+            self._forget(project_id, generation)
+
+    def _store(self, project_id, generation, cache_key, future):
+        with self._lock:
+            if self._renders.get(project_id) is future:
+                del self._renders[project_id]
+        self._forget(project_id, generation)
+        if future.cancelled():
+            return
+        try:
+            pdf = future.result()
+            # Una descarga pudo generarlo mientras tanto
+            if not self.cache.contains(cache_key):
+                self.cache.put(cache_key, pdf)
+        except Exception as e:
+            logger.error(f"Error pregenerando PDF para proyecto {project_id}: {e}")
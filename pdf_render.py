@@ -0,0 +1,180 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+
+
+class PdfRenderer:
+    """Long-lived WeasyPrint renderer for one stylesheet
+
+    Font discovery and CSS parsing happen once per process instead of on
+    every render. The stylesheet is parsed again only when the file
+    changes on disk.
+
+    Documents can also be rendered as a list of sections, each starting on
+    a new page. The layout of every section is kept in memory under a hash
+    of its HTML, so only the sections whose HTML changed are laid out again
+    and the pages are stitched into one PDF.
+
+    The font map behind FontConfiguration (Pango/fontconfig) is not thread
+    safe, so renders in one process run one at a time. Parallel renders
+    go to worker processes (PDF_WORKERS, batch exports).
+    """
+
+    # Nº máximo de secciones maquetadas en memoria: cada una es un árbol de maquetación
+    # completo, así que sólo se guardan las de los últimos documentos (3 secciones cada uno)
+    MAX_SECTIONS = 12
+
+    # Documento mínimo usado para calentar fuentes y estilos al arrancar
+    WARMUP_HTML = "<html><body><p>DocuLift</p></body></html>"
+
+    def __init__(self, css_path):
+        self.css_path = css_path
+        # Cubre maquetación y escritura, no sólo el cambio de hoja de estilos
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._font_config = None
+        self._css = None
+        self._sections = OrderedDict()
+
+    def _stylesheet(self):
+        stat = os.stat(self.css_path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self._stamp:
+            font_config = FontConfiguration()
+            self._css = CSS(filename=self.css_path, font_config=font_config)
+            self._font_config = font_config
+            self._stamp = stamp
+            self._sections.clear()
+        return self._css, self._font_config
+
+    def layout(self, html_content):
+        """Lay out an HTML document into WeasyPrint pages
+
+        The pages share this renderer's fonts: write them out while
+        holding the renderer, as render() does.
+        """
+        with self._lock:
+            css, font_config = self._stylesheet()
+            return HTML(string=html_content).render(
+                stylesheets=[css],
+                font_config=font_config
+            )
+
+    def render(self, html_content, target=None):
+        """Render an HTML document to PDF bytes, or into target if given"""
+        with self._lock:
+            return self.layout(html_content).write_pdf(target)
+
+    def render_sections(self, sections, target=None):
+        """Render a list of HTML sections to one PDF, reusing unchanged layouts"""
+        with self._lock:
+            self._stylesheet()
+            documents = []
+            for html_content in sections:
+                key = hashlib.sha256(html_content.encode("utf-8")).hexdigest()
+                document = self._sections.get(key)
+                if document is None:
+                    document = self._sections[key] = self.layout(html_content)
+                    while len(self._sections) > self.MAX_SECTIONS:
+                        self._sections.popitem(last=False)
+                else:
+                    self._sections.move_to_end(key)
+                documents.append(document)
+
+            pages = [page for document in documents for page in document.pages]
+            return documents[0].copy(pages).write_pdf(target)
+
+    def clear_sections(self):
+        """Forget every cached section layout"""
+        with self._lock:
+            self._sections.clear()
+
+    def warm(self):
+        """Load fonts and the stylesheet ahead of the first real render"""
+        self.render(self.WARMUP_HTML)
+
+
+class PdfTemplates:
+    """Compiled Jinja templates of the PDF kept for the life of the process
+
+    Templates are compiled again when a file in ``directory`` changes on
+    disk, even if the environment has auto reload turned off. The
+    directory is looked at no more than once every ``check_interval``
+    seconds, so renders don't walk it each time.
+    """
+
+    def __init__(self, jinja_env, directory, check_interval=2):
+        self.jinja_env = jinja_env
+        self.directory = directory
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._checked = None
+        self._templates = {}
+
+    def _current_stamp(self):
+        stamp = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                stat = os.stat(os.path.join(root, name))
+                stamp.append((root, name, stat.st_mtime_ns, stat.st_size))
+        return sorted(stamp)
+
+    def _check(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._checked is not None and now - self._checked < self.check_interval:
+                return
+            self._checked = now
+
+        stamp = self._current_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                # Las plantillas incluidas se resuelven a través de la caché del entorno
+                self._templates.clear()
+                if self.jinja_env.cache is not None:
+                    self.jinja_env.cache.clear()
+                self._stamp = stamp
+
+    def render(self, name, **context):
+        """Render one of the PDF templates with the given context"""
+        self._check()
+        with self._lock:
+            template = self._templates.get(name)
+            if template is None:
+                template = self._templates[name] = self.jinja_env.get_template(name)
+        return template.render(**context)
+
+
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+
+def get_renderer(css_path):
+    """Return this process's renderer for a stylesheet"""
+    with _renderers_lock:
+        renderer = _renderers.get(css_path)
+        if renderer is None:
+            renderer = _renderers[css_path] = PdfRenderer(css_path)
+        return renderer
+
+
+def warm_renderer(css_path):
+    """Warm this process's renderer, used as a worker process initializer"""
+    get_renderer(css_path).warm()
+
+
+def render_pdf(html_content, css_path, target=None):
+    """Render an HTML document, or a list of HTML sections, to PDF bytes
+
+    When ``target`` is a file object the PDF is written there instead of
+    being returned.
+    """
+    if isinstance(html_content, list):
+        return get_renderer(css_path).render_sections(html_content, target)
+    return get_renderer(css_path).render(html_content, target)
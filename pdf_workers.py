@@ -0,0 +1,215 @@
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import threading
+import time
+import uuid
+
+from pdf_render import render_pdf, warm_renderer
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(tasks, results, css_path, max_renders, max_rss_mb):
+    """Render jobs from the task queue until recycled"""
+    warm_renderer(css_path)
+    renders = 0
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        job_id, html_content, css_path = task
+        results.put(("started", job_id, os.getpid()))
+        try:
+            results.put(("done", job_id, render_pdf(html_content, css_path)))
+        except Exception as e:
+            results.put(("failed", job_id, str(e)))
+
+        # WeasyPrint retiene memoria entre renders: reciclar el proceso cada cierto tiempo
+        renders += 1
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        if renders >= max_renders or rss_mb >= max_rss_mb:
+            break
+
+    results.put(("exit", None, os.getpid()))
+
+
+class PdfWorkerPool:
+    """Pool of WeasyPrint worker processes fed from a job queue
+
+    Finished PDFs are stored in the PdfCache under the job's cache key.
+    Workers are replaced after ``max_renders`` renders or once their RSS
+    reaches ``max_rss_mb``, and a job running longer than ``timeout``
+    seconds has its worker killed. A job still queued ``timeout`` seconds
+    after it was submitted times out as well.
+    """
+
+    FINISHED = ("done", "failed", "timeout")
+
+    # Tiempo que se conserva el estado de un trabajo terminado
+    JOB_TTL = 600
+
+    def __init__(self, cache, css_path, processes, max_renders, max_rss_mb, timeout):
+        self.cache = cache
+        self.css_path = css_path
+        self.processes = processes
+        self.max_renders = max_renders
+        self.max_rss_mb = max_rss_mb
+        self.timeout = timeout
+
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._workers = {}
+        self._running = {}
+        self._started = False
+
+    def submit(self, user_id, cache_key, order_number, render_html, css_path):
+        """Queue a render and return the job status
+
+        ``render_html`` is only called if the PDF is not cached and no
+        identical job is already pending.
+        """
+        with self._lock:
+            self._start()
+            self._purge()
+
+            for job in self._jobs.values():
+                if (job["user_id"] == user_id and job["cache_key"] == cache_key
+                        and job["status"] not in ("failed", "timeout")):
+                    # Un trabajo terminado cuyo PDF ya salió de la caché no sirve: se vuelve a generar
+                    if job["status"] == "done" and not self.cache.contains(cache_key):
+                        continue
+                    return self._public(job)
+
+            job = {
+                "id": uuid.uuid4().hex,
+                "user_id": user_id,
+                "cache_key": cache_key,
+                "order_number": order_number,
+                "status": "queued",
+                "error": None,
+                "created": time.time(),
+                "finished": None,
+            }
+            self._jobs[job["id"]] = job
+
+            if self.cache.contains(cache_key):
+                self._finish(job, "done")
+                return self._public(job)
+
+        self._tasks.put((job["id"], render_html(), css_path))
+        return self._public(job)
+
+    def status(self, job_id, user_id):
+        """Return a job's status, or None if it doesn't belong to the user"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["user_id"] != user_id:
+                return None
+            return self._public(job)
+
+    def _public(self, job):
+        return {key: job[key] for key in ("id", "status", "error", "cache_key", "order_number")}
+
+    def _start(self):
+        if self._started:
+            return
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        for _ in range(self.processes):
+            self._spawn()
+        threading.Thread(target=self._collect, name="pdf-workers", daemon=True).start()
+        self._started = True
+
+    def _spawn(self):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self._tasks, self._results, self.css_path, self.max_renders, self.max_rss_mb),
+            daemon=True,
+        )
+        process.start()
+        self._workers[process.pid] = process
+
+    def _finish(self, job, status, error=None):
+        job["status"] = status
+        job["error"] = error
+        job["finished"] = time.time()
+
+    def _purge(self):
+        limit = time.time() - self.JOB_TTL
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job["finished"] and job["finished"] < limit]:
+            del self._jobs[job_id]
+
+    def _collect(self):
+        """Apply worker results, enforce timeouts and replace dead workers"""
+        while True:
+            try:
+                kind, job_id, value = self._results.get(timeout=1)
+            except queue.Empty:
+                kind = job_id = value = None
+
+            if kind == "done":
+                # Guardar fuera del lock: escribir en disco puede tardar
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    try:
+                        self.cache.put(job["cache_key"], value)
+                    except Exception as e:
+                        logger.error(f"Error guardando PDF del trabajo {job_id}: {e}")
+                        kind, value = "failed", str(e)
+
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if kind == "started" and job is not None:
+                    # Un trabajo que agotó su tiempo en la cola conserva ese estado
+                    if job["finished"] is None:
+                        job["status"] = "running"
+                    self._running[job_id] = (value, time.time())
+                elif kind in ("done", "failed"):
+                    self._running.pop(job_id, None)
+                    if job is not None and (job["finished"] is None or kind == "done"):
+                        self._finish(job, kind, value if kind == "failed" else None)
+                elif kind == "exit":
+                    process = self._workers.pop(value, None)
+                    if process is not None:
+                        process.join(timeout=1)
+                    self._spawn()
+
+                self._check_workers()
+
+    def _check_workers(self):
+        now = time.time()
+        # Un trabajo que no llega a empezar (p. ej. su proceso murió antes de recogerlo) también caduca
+        for job in self._jobs.values():
+            if job["status"] == "queued" and now - job["created"] >= self.timeout:
+                self._finish(job, "timeout", "Tiempo de espera agotado")
+
+        for job_id, (pid, started) in list(self._running.items()):
+            process = self._workers.get(pid)
+            if process is not None and process.is_alive() and now - started < self.timeout:
+                continue
+
+            del self._running[job_id]
+            job = self._jobs.get(job_id)
+            if job is not None:
+                if process is not None and process.is_alive():
+                    self._finish(job, "timeout", "Tiempo de generación agotado")
+                else:
+                    self._finish(job, "failed", "El proceso de generación terminó inesperadamente")
+
+            if process is not None:
+                process.kill()
+                process.join(timeout=1)
+                del self._workers[pid]
+                self._spawn()
+
+        # Sustituir procesos que hayan muerto sin estar procesando ningún trabajo
+        for pid, process in list(self._workers.items()):
+            if not process.is_alive() and process.exitcode not in (None, 0):
+                del self._workers[pid]
+                self._spawn()
@@ -0,0 +1,67 @@
+import base64
+import binascii
+import re
+import sqlite3
+
+# Días que se guardan los proyectos borrados; un token más antiguo obliga a recargar la lista
+TOMBSTONE_DAYS = 30
+
+# Segundos que el token se queda por detrás del reloj: cubre las transacciones que
+# fijaron su CURRENT_TIMESTAMP antes de la consulta pero confirmaron después
+TOKEN_MARGIN_SECONDS = 5
+
+TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+
+CHANGES_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS projects_deleted (
+    project_id INTEGER PRIMARY KEY,
+    user_id    INTEGER NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_projects_deleted_user_deleted
+ON projects_deleted (user_id, deleted_at);
+
+CREATE TRIGGER IF NOT EXISTS projects_deleted_record AFTER DELETE ON projects_test BEGIN
+    INSERT OR REPLACE INTO projects_deleted (project_id, user_id, deleted_at)
+    VALUES (old.id, old.user_id, CURRENT_TIMESTAMP);
+    DELETE FROM projects_deleted
+    WHERE user_id = old.user_id AND deleted_at < datetime('now', '-{TOMBSTONE_DAYS} days');
+END;
+
+CREATE TRIGGER IF NOT EXISTS projects_deleted_reuse AFTER INSERT ON projects_test BEGIN
+    DELETE FROM projects_deleted WHERE project_id = new.id;
+END;
+"""
+
+# Token nuevo y fecha más antigua que aún se puede servir, con el reloj de SQLite (UTC)
+TOKEN_QUERY = f"""
+SELECT datetime('now', '-{TOKEN_MARGIN_SECONDS} seconds') AS token,
+       datetime('now', '-{TOMBSTONE_DAYS} days') AS horizon
+"""
+
+
+def ensure_changes_schema(path):
+    """Create the tombstone table for deleted projects and its triggers if missing"""
+    con = sqlite3.connect(path)
+    try:
+        with con:
+            con.executescript(CHANGES_SCHEMA)
+    finally:
+        con.close()
+
+
+def encode_change_token(timestamp):
+    """Encode a change timestamp as an opaque token"""
+    return base64.urlsafe_b64encode(timestamp.encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_change_token(token):
+    """Return the timestamp of a change token, or None if it is malformed"""
+    try:
+        timestamp = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("ascii")
+    except (binascii.Error, ValueError):
+        return None
+    if not TIMESTAMP_RE.fullmatch(timestamp):
+        return None
+    return timestamp
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+
+from project_form import project_form
+
+# Columnas exportadas, con los mismos nombres que acepta project_import
+EXPORT_COLUMNS = ["id", *project_form.columns, "reference_text", "status", "created_at", "updated_at"]
+EXPORT_LINKS = [link.reference for link in project_form.links]
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+
+def export_projects(db, reference, user_id, batch_size=500):
+    """Yield every project of a user as a dict, codes included, by order number
+
+    Rows come from a server-side cursor ``batch_size`` at a time, so the
+    result set is never held in memory. The order is that of the
+    (user_id, order_number) index: sorting by id would make SQLite build
+    the whole result in a temporary B-tree before returning the first row.
+    """
+    rows = db.iterate(
+        f"""SELECT {", ".join(EXPORT_COLUMNS)},
+        {project_form.select_links}
+        FROM projects_test
+        WHERE user_id = ?
+        ORDER BY order_number""",
+        user_id, batch_size=batch_size
+    )
+    tables = [getattr(reference, name).id_to_code for name in EXPORT_LINKS]
+    width = len(EXPORT_COLUMNS)
+    for row in rows:
+        project = dict(zip(EXPORT_COLUMNS, row))
+        for name, id_to_code, ids in zip(EXPORT_LINKS, tables, row[width:]):
+            project[name] = [id_to_code[ref_id] for ref_id in json.loads(ids)]
+        yield project
+
+
+def stream_csv(projects, batch_size=500):
+    """Encode projects as CSV chunks of about ``batch_size`` rows
+
+    The codes of each reference table go in one cell separated by ";",
+    the way project_import reads them back.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel reconozca UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_COLUMNS + EXPORT_LINKS)
+    yield buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+    count = 0
+    for project in projects:
+        writer.writerow([project[column] for column in EXPORT_COLUMNS] +
+                        [";".join(project[name]) for name in EXPORT_LINKS])
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def stream_ndjson(projects, batch_size=500):
+    """Encode projects as NDJSON chunks of about ``batch_size`` lines"""
+    lines = []
+    for project in projects:
+        lines.append(json.dumps(project, ensure_ascii=False, default=str))
+        if len(lines) == batch_size:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
@@ -0,0 +1,179 @@
+from collections import namedtuple
+
+# column: columna de projects_test, name: campo del formulario
+Field = namedtuple("Field", "column name required check")
+
+# reference: tabla de referencia, name: campo del formulario, link_table/link_column: tabla
+# intermedia y su columna con el id de referencia, error_key: id del input que muestra el error
+Link = namedtuple("Link", "reference name link_table link_column error_key multiple invalid_message")
+
+
+def is_zip(value):
+    """Spanish postal code: five digits"""
+    return value.isdigit() and len(value) == 5
+
+
+# Validaciones de formato: (función, mensaje de error)
+CHECKS = {
+    "zip": (is_zip, "El código postal debe tener 5 dígitos"),
+}
+
+PROJECT_FIELDS = [
+    Field("order_number", "orderNumber", True, None),
+    Field("rae", "rae", True, None),
+    Field("client_name", "clientName", True, None),
+    Field("client_nif", "clientNIF", True, None),
+    Field("client_address", "clientAddress", True, None),
+    Field("client_city", "clientCity", True, None),
+    Field("client_zip", "clientZip", True, "zip"),
+    Field("lift_address", "liftAddress", True, None),
+    Field("lift_city", "liftCity", True, None),
+    Field("lift_zip", "liftZip", True, "zip"),
+    Field("exam_type", "examType", False, None),
+    Field("oca", "oca", False, None),
+    Field("qms", "qualityManagementSystem", False, None),
+    Field("nominal_load", "nominalLoad", False, None),
+    Field("speed", "speed", False, None),
+    Field("machine_room", "machineRoomInput", False, None),
+    Field("passengers", "passengers", False, None),
+    Field("control_system", "controlSystemInput", False, None),
+    Field("cab_dimensions", "cabDimensions", False, None),
+    Field("stops", "stops", False, None),
+    Field("nominal_tension", "nominalTensionInput", False, None),
+    Field("door_type", "doorTypeInput", False, None),
+    Field("travel", "travel", False, None),
+    Field("nominal_power", "nominalPower", False, None),
+    Field("door_size", "doorSize", False, None),
+    Field("num_cable", "numCable", False, None),
+    Field("nominal_intensity", "nominalIntensity", False, None),
+    Field("cable_diameter", "cableDiameterInput", False, None),
+    Field("ratio", "ratioInput", False, None),
+    Field("cab_mass", "cabMass", False, None),
+    Field("cab_rails", "cabRailsInput", False, None),
+    Field("cw_mass", "cwMass", False, None),
+    Field("cw_rails", "cwRailsInput", False, None),
+    Field("locking_device1", "lockingDevice1Input", False, None),
+    Field("locking_device2", "lockingDevice2Input", False, None),
+    Field("machine_brake", "machineBrakeInput", False, None),
+    Field("cab_parachute", "cabParachuteInput", False, None),
+    Field("cw_parachute", "cwParachuteInput", False, None),
+    Field("cab_speed_governor", "cabSpeedGovernorInput", False, None),
+    Field("cw_speed_governor", "cwSpeedGovernorInput", False, None),
+    Field("cab_buffer", "cabBufferInput", False, None),
+    Field("cw_buffer", "cwBufferInput", False, None),
+    Field("safety_circuit", "safetyCircuitInput", False, None),
+    Field("ucm_detect", "ucmDETECTInput", False, None),
+    Field("ucm_act", "ucmACTInput", False, None),
+    Field("ucm_stop", "ucmSTOPInput", False, None),
+]
+
+PROJECT_LINKS = [
+    Link("modification_types", "modification_types", "project_modification_types", "modification_type_id",
+         "ModificationTypesInput", True, "Tipo de modificación inválido"),
+    Link("applicable_norms", "applicable_norms", "project_applicable_norms", "applicable_norm_id",
+         "AplicableNormsInput", True, "Normativa aplicable inválida"),
+    Link("legalization_process", "legalization_process", "project_legalization_process", "legalization_process_id",
+         "LegalizationProcessInput", False, "Proceso de legalización inválido"),
+]
+
+
+class ProjectForm:
+    """The project form compiled once from PROJECT_FIELDS and PROJECT_LINKS
+
+    ``parse`` reads, strips and validates every field in one pass and
+    returns all the errors at once. The INSERT, UPDATE and SELECT statements
+    are built here at import time; ``insert_params`` and ``update_params``
+    return their arguments in column order, and ``select_links`` selects
+    the ids in each junction table as a JSON array.
+    """
+
+    def __init__(self, fields, links, table="projects_test"):
+        self.fields = tuple(fields)
+        self.links = tuple(links)
+        self.columns = tuple(field.column for field in self.fields)
+        self.field_names = {field.name: field for field in self.fields}
+        self.link_names = {link.name: link for link in self.links}
+
+        # Pasos del parser ya resueltos: sin búsquedas en CHECKS por petición
+        self._steps = tuple(
+            (field.column, field.name, field.required, *(CHECKS[field.check] if field.check else (None, None)))
+            for field in self.fields
+        )
+
+        columns = ", ".join(self.columns)
+        self.insert_sql = (f"INSERT INTO {table} (user_id, {columns}, created_at) "
+                           f"VALUES (?, {', '.join('?' * len(self.columns))}, CURRENT_TIMESTAMP)")
+        self.update_sql = (f"UPDATE {table} SET {', '.join(c + ' = ?' for c in self.columns)}, "
+                           f"updated_at = CURRENT_TIMESTAMP WHERE id = ?")
+        self.select_columns = f"id, {columns}, created_at, updated_at"
+        # Ids de cada tabla intermedia como array JSON, una columna por referencia
+        self.select_links = ",\n".join(
+            f"""(SELECT json_group_array({link.link_column}) FROM
+                (SELECT {link.link_column} FROM {link.link_table}
+                 WHERE project_id = {table}.id ORDER BY {link.link_column})) AS {link.reference}"""
+            for link in self.links
+        )
+
+    def parse(self, form, reference):
+        """Return (values, links, errors) for a submitted form
+
+        ``values`` maps column to stripped text, ``links`` maps each
+        reference table to the list of selected codes and ``errors`` maps
+        input id to message, keyed like the ``fieldErrors`` the page expects.
+        """
+        values = {}
+        errors = {}
+        for column, name, required, check, message in self._steps:
+            value = (form.get(name) or "").strip()
+            values[column] = value
+            if not value:
+                if required:
+                    errors[name] = "Campo requerido"
+            elif check is not None and not check(value):
+                errors[name] = message
+
+        links = {}
+        for link in self.links:
+            table = getattr(reference, link.reference)
+            if link.multiple:
+                codes = form.getlist(link.name)
+            else:
+                code = form.get(link.name)
+                codes = [code] if code else []
+            links[link.reference] = codes
+
+            if not codes:
+                errors[link.error_key] = "Campo requerido"
+            elif len(set(codes)) != len(codes) or not table.codes.issuperset(codes):
+                errors[link.error_key] = link.invalid_message
+        return values, links, errors
+
+    def check(self, name, value, reference):
+        """Validate the format of one non-empty field, returning an error message or None"""
+        field = self.field_names.get(name)
+        if field is not None:
+            if field.check is None:
+                return None
+            check, message = CHECKS[field.check]
+            return None if isinstance(value, str) and check(value) else message
+
+        link = self.link_names.get(name)
+        if link is not None:
+            codes = value if link.multiple else [value]
+            if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+                return link.invalid_message
+            table = getattr(reference, link.reference)
+            if len(set(codes)) != len(codes) or not table.codes.issuperset(codes):
+                return link.invalid_message
+        return None
+
+    def insert_params(self, user_id, values):
+        """Arguments of insert_sql"""
+        return (user_id, *[values[column] for column in self.columns])
+
+    def update_params(self, values, project_id):
+        """Arguments of update_sql"""
+        return (*[values[column] for column in self.columns], project_id)
+
+
+project_form = ProjectForm(PROJECT_FIELDS, PROJECT_LINKS)
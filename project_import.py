@@ -0,0 +1,172 @@
+import csv
+import io
+import json
+import re
+import sqlite3
+from itertools import islice
+
+from project_form import project_form
+
+# (campo del formulario, columna del registro importado) y columna de cada clave de error
+FIELD_KEYS = [(field.name, field.column) for field in project_form.fields]
+FIELD_KEYS += [(link.name, link.reference) for link in project_form.links]
+SINGLE_LINKS = [link.name for link in project_form.links if not link.multiple]
+LINK_COLUMNS = {link.reference for link in project_form.links}
+ERROR_COLUMNS = {**dict(FIELD_KEYS), **{link.error_key: link.reference for link in project_form.links}}
+
+# Separadores de los códigos dentro de una celda: "1;10", "1, 10", "1|10"
+CODE_SEPARATORS = re.compile(r"[;,|\s]+")
+
+FORMATS = ("csv", "ndjson")
+
+
+class _RecordForm(dict):
+    """An imported record with the get/getlist interface of request.form
+
+    Records are keyed by projects_test column (order_number, client_zip...)
+    and by reference table for the codes; they are re-keyed by input name
+    so the rows go through the same project_form.parse() as add_project.
+    """
+
+    def __init__(self, record):
+        super().__init__({name: record.get(key) for name, key in FIELD_KEYS})
+        # Un solo código también puede venir como lista de un elemento, como lo exporta project_export
+        for name in SINGLE_LINKS:
+            value = self.get(name)
+            if isinstance(value, list):
+                self[name] = ";".join(str(code) for code in value)
+
+    def getlist(self, name):
+        value = self.get(name)
+        if value is None:
+            return []
+        if isinstance(value, list):
+            return [str(code) for code in value]
+        return [code for code in CODE_SEPARATORS.split(value) if code]
+
+
+def detect_format(filename):
+    """Return "csv" or "ndjson" from a file name, or None"""
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension == "csv":
+        return "csv"
+    if extension in ("ndjson", "jsonl"):
+        return "ndjson"
+    return None
+
+
+def read_records(stream, file_format):
+    """Yield (line number, record) from a binary stream, one row at a time
+
+    A row that can't be read is yielded as (line number, error message).
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if file_format == "csv":
+        return _read_csv(text)
+    return _read_ndjson(text)
+
+
+def _read_csv(text):
+    header = text.readline()
+    # Excel en español guarda los CSV con punto y coma
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    columns = [column.strip() for column in next(csv.reader([header], delimiter=delimiter), [])]
+    reader = csv.DictReader(text, fieldnames=columns, delimiter=delimiter)
+    for record in reader:
+        yield reader.line_num + 1, record
+
+
+def _read_ndjson(text):
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, "JSON inválido"
+            continue
+        if not isinstance(record, dict):
+            yield number, "Se esperaba un objeto JSON"
+            continue
+        # Números y booleanos se validan como el texto que enviaría el formulario
+        yield number, {key: str(value) if isinstance(value, (int, float)) else value
+                       for key, value in record.items()}
+
+
+def _invalid_values(record):
+    """Return {column: message} for the values no form field can take
+
+    Only the code columns accept a list; any other list or object would
+    reach project_form.parse() as something that isn't text.
+    """
+    return {key: "Valor inválido" for _, key in FIELD_KEYS
+            if not (record.get(key) is None or isinstance(record[key], str)
+                    or (key in LINK_COLUMNS and isinstance(record[key], list)))}
+
+
+def import_projects(db, reference, user_id, records, on_error, chunk_size=500):
+    """Validate and insert projects read by read_records(); return (imported, failed)
+
+    Rows are validated with project_form, like add_project, and inserted
+    ``chunk_size`` at a time, each chunk in one transaction with its
+    junction rows. Invalid rows are skipped and passed to
+    ``on_error(line number, {column: message})``. Only one chunk is held
+    in memory at a time.
+    """
+    imported = failed = 0
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return imported, failed
+        valid = []
+        for number, record in chunk:
+            if isinstance(record, str):
+                errors = {"row": record}
+            else:
+                errors = _invalid_values(record)
+                if not errors:
+                    values, links, errors = project_form.parse(_RecordForm(record), reference)
+                    errors = {ERROR_COLUMNS.get(key, key): message for key, message in errors.items()}
+            if errors:
+                on_error(number, errors)
+                failed += 1
+            else:
+                valid.append((number, values, links))
+
+        inserted, rejected = _insert_chunk(db, reference, user_id, valid)
+        for number in rejected:
+            on_error(number, {"order_number": "Nº de orden ya en uso"})
+        imported += inserted
+        failed += len(rejected)
+
+
+def _insert_chunk(db, reference, user_id, rows):
+    """Insert one chunk of valid rows; return (inserted, line numbers rejected as duplicates)"""
+    if not rows:
+        return 0, []
+    inserted = 0
+    rejected = []
+    links = {link.reference: [] for link in project_form.links}
+    with db.transaction():
+        with db.connection() as connection:
+            for number, values, codes in rows:
+                # El índice único (user_id, order_number) detecta los duplicados, también dentro del fichero
+                try:
+                    project_id = connection.execute(
+                        project_form.insert_sql, project_form.insert_params(user_id, values)
+                    ).lastrowid
+                except sqlite3.IntegrityError:
+                    rejected.append(number)
+                    continue
+                inserted += 1
+                for link in project_form.links:
+                    code_to_id = getattr(reference, link.reference).code_to_id
+                    links[link.reference].extend((project_id, code_to_id[code]) for code in codes[link.reference])
+
+            for link in project_form.links:
+                connection.executemany(
+                    f"INSERT INTO {link.link_table} (project_id, {link.link_column}) VALUES (?, ?)",
+                    links[link.reference]
+                )
+    return inserted, rejected
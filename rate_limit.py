@@ -0,0 +1,36 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """Per-client token buckets kept in memory
+
+    Each client may make ``burst`` requests at once and then ``rate`` per
+    second. Only the ``max_clients`` most recently seen clients are
+    tracked; the oldest bucket is dropped when a new client arrives.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def hit(self, client):
+        """Take one token for ``client``; return 0 if allowed, else the seconds to wait"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = math.ceil((1 - tokens) / self.rate)
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+# Tablas de códigos que casi nunca cambian
+REFERENCE_TABLES = ("modification_types", "applicable_norms", "legalization_process")
+
+ReferenceTable = namedtuple("ReferenceTable", "rows codes code_to_id id_to_code id_to_label")
+ReferenceSnapshot = namedtuple("ReferenceSnapshot", "version modification_types applicable_norms legalization_process")
+
+
+class ReferenceData:
+    """In-process copy of the reference tables as read-only lookups
+
+    ``get()`` returns a snapshot holding, for each table, the rows in id
+    order plus frozen code set, code→id, id→code and id→label maps, so
+    validation and code mapping need no queries. The snapshot carries a
+    ``version`` that goes up whenever the contents change.
+
+    Freshness is checked with ``PRAGMA data_version`` on a private
+    connection: it only changes when another connection commits, and then
+    the three small tables are read again. The check runs at most once
+    every ``check_interval`` seconds; in between ``get()`` returns the
+    snapshot without locking, so per-project calls in a loop cost nothing.
+    """
+
+    def __init__(self, path, check_interval=2):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._data_version = None
+        self._snapshot = None
+        self._checked = None
+
+    def get(self):
+        """Return the current snapshot, reloading it if the database changed"""
+        checked = self._checked
+        if checked is not None and time.monotonic() - checked < self.check_interval:
+            return self._snapshot
+
+        with self._lock:
+            data_version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+            if self._snapshot is None or data_version != self._data_version:
+                self._reload()
+                self._data_version = data_version
+            self._checked = time.monotonic()
+            return self._snapshot
+
+    def _reload(self):
+        tables = {table: self._load_table(table) for table in REFERENCE_TABLES}
+        if self._snapshot is not None:
+            unchanged = all(tables[table].rows == getattr(self._snapshot, table).rows for table in REFERENCE_TABLES)
+            if unchanged:
+                return
+            version = self._snapshot.version + 1
+        else:
+            version = 1
+        self._snapshot = ReferenceSnapshot(version, **tables)
+
+    def _load_table(self, table):
+        cursor = self._connection.execute(f"SELECT id, code, label FROM {table} ORDER BY id")
+        rows = tuple(MappingProxyType({"id": id, "code": code, "label": label}) for id, code, label in cursor)
+        return ReferenceTable(
+            rows=rows,
+            codes=frozenset(row["code"] for row in rows),
+            code_to_id=MappingProxyType({row["code"]: row["id"] for row in rows}),
+            id_to_code=MappingProxyType({row["id"]: row["code"] for row in rows}),
+            id_to_label=MappingProxyType({row["id"]: row["label"] for row in rows}),
+        )
@@ -0,0 +1,88 @@
+import re
+import sqlite3
+
+# Columnas de projects_test que se indexan, en el orden de la tabla FTS
+SEARCH_COLUMNS = ["order_number", "rae", "client_name", "client_nif", "client_address",
+                  "client_city", "lift_address", "lift_city"]
+
+# Peso de cada columna en el ranking bm25 (mismo orden que SEARCH_COLUMNS)
+SEARCH_WEIGHTS = [10.0, 10.0, 4.0, 10.0, 2.0, 1.0, 2.0, 1.0]
+
+# Palabras de la búsqueda: letras y dígitos, igual que el tokenizador unicode61
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SEARCH_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS projects_search USING fts5(
+    {", ".join(SEARCH_COLUMNS)},
+    content='projects_test',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3 4'
+);
+
+CREATE TRIGGER IF NOT EXISTS projects_search_insert AFTER INSERT ON projects_test BEGIN
+    INSERT INTO projects_search (rowid, {", ".join(SEARCH_COLUMNS)})
+    VALUES (new.id, {", ".join("new." + c for c in SEARCH_COLUMNS)});
+END;
+
+CREATE TRIGGER IF NOT EXISTS projects_search_delete AFTER DELETE ON projects_test BEGIN
+    INSERT INTO projects_search (projects_search, rowid, {", ".join(SEARCH_COLUMNS)})
+    VALUES ('delete', old.id, {", ".join("old." + c for c in SEARCH_COLUMNS)});
+END;
+
+CREATE TRIGGER IF NOT EXISTS projects_search_update
+AFTER UPDATE OF {", ".join(SEARCH_COLUMNS)} ON projects_test BEGIN
+    INSERT INTO projects_search (projects_search, rowid, {", ".join(SEARCH_COLUMNS)})
+    VALUES ('delete', old.id, {", ".join("old." + c for c in SEARCH_COLUMNS)});
+    INSERT INTO projects_search (rowid, {", ".join(SEARCH_COLUMNS)})
+    VALUES (new.id, {", ".join("new." + c for c in SEARCH_COLUMNS)});
+END;
+"""
+
+
+def ensure_search_index(path):
+    """Create the FTS5 index over projects_test and its triggers if missing
+
+    The index is filled from the existing projects the first time it is
+    created; after that the triggers keep it in sync.
+    """
+    con = sqlite3.connect(path)
+    try:
+        exists = con.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'projects_search'"
+        ).fetchone()
+        with con:
+            con.executescript(SEARCH_SCHEMA)
+            if not exists:
+                con.execute("INSERT INTO projects_search (projects_search) VALUES ('rebuild')")
+    finally:
+        con.close()
+
+
+def match_query(text):
+    """Turn what the user typed into an FTS5 query, or None if there is nothing to search
+
+    Every word must appear in some indexed column. The last one is matched
+    as a prefix, so "juan garc" finds "Juan García" while the user is still
+    typing; earlier words are complete and matched exactly, which is cheaper.
+    """
+    tokens = TOKEN_RE.findall(text or "")
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def is_broad(text, min_chars):
+    """Return True if the query is a single word shorter than ``min_chars``
+
+    Such a prefix ("ca", "12") matches a large share of the projects.
+    """
+    tokens = TOKEN_RE.findall(text or "")
+    return len(tokens) == 1 and len(tokens[0]) < min_chars
+
+
+def rank_expression():
+    """Return the bm25() call that ranks matches with the column weights"""
+    return f"bm25(projects_search, {', '.join(str(w) for w in SEARCH_WEIGHTS)})"
@@ -0,0 +1,190 @@
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at);
+"""
+
+
+class StoredSession(CallbackDict, SessionMixin):
+    """Session whose contents live on the server under a random id"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+
+
+class SqliteSessionInterface(SessionInterface):
+    """Server-side sessions in a SQLite table with an in-memory LRU in front
+
+    The cookie only carries a random id. Sessions read recently are served
+    from an LRU of ``max_entries``; the table is only read on a miss and
+    only written when the session was modified, or when less than half of
+    its lifetime is left. ``PRAGMA data_version`` tells when another
+    process wrote a session (a login or logout in another worker), and then
+    the LRU is emptied.
+
+    Sessions expire after ``idle_timeout`` seconds without use, or after the
+    app's permanent_session_lifetime if they are permanent. A daemon thread
+    deletes expired rows every ``sweep_interval`` seconds.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, path, idle_timeout, max_entries=10000, sweep_interval=300):
+        self.idle_timeout = idle_timeout
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.executescript(SESSION_SCHEMA)
+        self._data_version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+
+        self._stop = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep_loop, args=(sweep_interval,),
+                                         name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            entry = self._load(sid)
+            if entry is not None:
+                data, expires_at = entry
+                session = StoredSession(data, sid)
+                session.expires_at = expires_at
+                return session
+        return StoredSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if not session:
+            # Sesión vaciada (logout): borrar la fila y la cookie
+            if session.modified and not session.new:
+                self._delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        lifetime = self._lifetime(app, session)
+        now = time.time()
+        if session.modified or session.new:
+            self._store(session.sid, dict(session), now + lifetime)
+        elif session.expires_at - now < lifetime / 2:
+            # Renovar la caducidad de vez en cuando, no en cada petición
+            self._touch(session.sid, now + lifetime)
+        else:
+            return
+
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+    def sweep(self):
+        """Delete the expired sessions; return how many rows were removed"""
+        now = time.time()
+        with self._lock:
+            for sid in [sid for sid, (_, expires_at) in self._cache.items() if expires_at <= now]:
+                del self._cache[sid]
+            return self._connection.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+
+    def close(self):
+        """Stop the sweeper thread"""
+        self._stop.set()
+
+    def _lifetime(self, app, session):
+        if session.permanent:
+            return app.permanent_session_lifetime.total_seconds()
+        return self.idle_timeout
+
+    def _load(self, sid):
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            entry = self._cache.get(sid)
+            if entry is not None:
+                self._cache.move_to_end(sid)
+            else:
+                entry = self._connection.execute(
+                    "SELECT data, expires_at FROM sessions WHERE id = ?", (sid,)
+                ).fetchone()
+                if entry is None:
+                    return None
+                self._remember(sid, entry)
+        if entry[1] <= now:
+            return None
+        # Se guarda el texto serializado: cada petición recibe su propia copia
+        return self.serializer.loads(entry[0]), entry[1]
+
+    def _store(self, sid, data, expires_at):
+        data = self.serializer.dumps(data)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (sid, data, expires_at)
+            )
+            self._remember(sid, (data, expires_at))
+
+    def _touch(self, sid, expires_at):
+        with self._lock:
+            self._connection.execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (expires_at, sid))
+            entry = self._cache.get(sid)
+            if entry is not None:
+                self._cache[sid] = (entry[0], expires_at)
+
+    def _delete(self, sid):
+        with self._lock:
+            self._connection.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+            self._cache.pop(sid, None)
+
+    def _remember(self, sid, entry):
+        self._cache[sid] = entry
+        self._cache.move_to_end(sid)
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def _check_version(self):
+        # Solo cambia si otra conexión (otro proceso) ha escrito sesiones
+        data_version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._cache.clear()
+            self._data_version = data_version
+
+    def _sweep_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Error borrando sesiones caducadas: {e}")